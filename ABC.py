@@ -1,6 +1,8 @@
 from openpyxl import Workbook, load_workbook
 from datetime import datetime
 
+from time_index import TimeIndex, format_epoch_us, from_epoch_us, to_epoch_us
+
 # Vehicle class
 class Vehicle:
     def __init__(self, vehicle_id, vehicle_type, license_plate):
@@ -34,11 +36,19 @@ class TollTransaction:
         self.vehicle = vehicle
         self.toll_booth = toll_booth
         self.amount = amount
-        self.timestamp = datetime.now()
+        self.timestamp_us = to_epoch_us(datetime.now())
+
+    @property
+    def timestamp(self):
+        return from_epoch_us(self.timestamp_us)
+
+    @timestamp.setter
+    def timestamp(self, value):
+        self.timestamp_us = to_epoch_us(value)
 
     def display_transaction_details(self):
         return f"ID: {self.transaction_id}, Vehicle: {self.vehicle.vehicle_id}, Booth: {self.toll_booth.booth_id}, " \
-               f"Amount: ${self.amount:.2f}, Date: {self.timestamp.strftime('%Y-%m-%d %H:%M:%S')}"
+               f"Amount: ${self.amount:.2f}, Date: {format_epoch_us(self.timestamp_us)}"
 
 
 # TollManagementSystem class
@@ -47,6 +57,7 @@ class TollManagementSystem:
         self.vehicles = []
         self.toll_booths = []
         self.transactions = []
+        self.time_index = TimeIndex()
         self.vehicle_file = "vehicles.xlsx"
         self.booth_file = "toll_booths.xlsx"
         self.transaction_file = "transactions.xlsx"
@@ -89,8 +100,9 @@ class TollManagementSystem:
                 vehicle = next((v for v in self.vehicles if v.vehicle_id == row[1]), None)
                 toll_booth = next((b for b in self.toll_booths if b.booth_id == row[2]), None)
                 transaction = TollTransaction(row[0], vehicle, toll_booth, row[3])
-                transaction.timestamp = datetime.strptime(row[4], '%Y-%m-%d %H:%M:%S')
+                transaction.timestamp_us = to_epoch_us(row[4])
                 self.transactions.append(transaction)
+                self.time_index.add(transaction.timestamp_us, transaction)
             wb.close()
         except FileNotFoundError:
             print("No existing transaction data found. Starting fresh.")
@@ -118,7 +130,7 @@ class TollManagementSystem:
         ws.append(["Transaction ID", "Vehicle ID", "Booth ID", "Amount", "Timestamp"])
         for transaction in self.transactions:
             ws.append([transaction.transaction_id, transaction.vehicle.vehicle_id, transaction.toll_booth.booth_id,
-                       transaction.amount, transaction.timestamp.strftime('%Y-%m-%d %H:%M:%S')])
+                       transaction.amount, format_epoch_us(transaction.timestamp_us)])
         wb.save(self.transaction_file)
 
     def add_vehicle(self, vehicle_id, vehicle_type, license_plate):
@@ -147,9 +159,13 @@ class TollManagementSystem:
             amount = toll_booth.calculate_toll(vehicle.vehicle_type)
             transaction = TollTransaction(transaction_id, vehicle, toll_booth, amount)
             self.transactions.append(transaction)
+            self.time_index.add(transaction.timestamp_us, transaction)
             return f"Transaction recorded successfully! Amount: ${amount:.2f}"
         return "Invalid Vehicle ID or Booth ID."
 
+    def transactions_between(self, start=None, end=None):
+        return self.time_index.between(start, end)
+
     def view_transaction_history(self):
         if not self.transactions:
             return "No transactions found."
@@ -1,8 +1,21 @@
 from abc import ABC, abstractmethod
+from contextlib import nullcontext
 import openpyxl
-from datetime import datetime
+from datetime import datetime, timedelta
+import math
 import os
 
+from archive import transaction_number
+from cdc import EventFeed, deposit_id
+from export import TRANSACTION_HEADERS, USER_HEADERS, export_transactions, export_users, transaction_rows
+from fees import FEE_ACCOUNT_ID, FEE_ACCOUNT_NAME, FeeEngine
+from limits import VelocityLimiter
+from metrics import registry, start_http_server, start_periodic_dump, timed
+from occ import OptimisticTransfers, VersionConflict
+from recovery import Journal, checkpoint, recover, write_snapshot
+from time_index import TimeIndex, format_epoch_us, to_epoch_us
+from tracing import tracer
+
 
 class WalletInterface(ABC):
     """Abstract class defining the wallet interface."""
@@ -28,6 +41,7 @@ class Wallet(WalletInterface):
     def deposit(self, amount):
         self.balance += amount
 
+    @timed("bkash_wallet_withdraw")
     def withdraw(self, amount):
         if self.balance >= amount:
             self.balance -= amount
@@ -67,20 +81,39 @@ class User(UserInterface):
 
 
 class Transaction:
-    """Represents a transaction between two users."""
+    """Represents a transaction between two users.
+
+    Only the user IDs are stored; sender and receiver are looked up in users
+    (the system's users dict or repository) when needed, so the ledger never
+    keeps User objects alive or holds stale copies of them.
+    """
 
-    def __init__(self, transaction_id, sender, receiver, amount, date=None):
+    def __init__(self, transaction_id, sender_id, receiver_id, amount, date=None, users=None):
         self.transaction_id = transaction_id
-        self.sender = sender
-        self.receiver = receiver
+        self.sender_id = sender_id
+        self.receiver_id = receiver_id
         self.amount = amount
-        self.date = date if date else datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.users = users
+        # Kept as integer epoch microseconds; the date string is built only when displayed.
+        self.timestamp = to_epoch_us(date if date else datetime.now())
+
+    @property
+    def sender(self):
+        return self.users[self.sender_id]
+
+    @property
+    def receiver(self):
+        return self.users[self.receiver_id]
+
+    @property
+    def date(self):
+        return format_epoch_us(self.timestamp)
 
     def to_dict(self):
         return {
             "Transaction ID": self.transaction_id,
-            "Sender": self.sender.user_id,
-            "Receiver": self.receiver.user_id,
+            "Sender": self.sender_id,
+            "Receiver": self.receiver_id,
             "Amount": self.amount,
             "Date": self.date,
         }
@@ -109,52 +142,139 @@ class PaymentSystemInterface(ABC):
 class MobilePaymentSystem(PaymentSystemInterface):
     """Concrete implementation of the PaymentSystemInterface."""
 
-    def __init__(self, users_file="users.xlsx", transactions_file="transactions.xlsx"):
+    def __init__(self, users_file="users.xlsx", transactions_file="transactions.xlsx", fee_engine=None,
+                 ledger=None, archive=None, journal=None, snapshot_file="snapshot.json", balance_table=None,
+                 user_repository=None, event_feed=None, limiter=None, statements=None, analytics=None,
+                 search_index=None, wallet_store=None):
+        if wallet_store is not None and journal is not None:
+            raise ValueError("a wallet store commits each transfer itself and cannot be combined with a journal")
         self.users_file = users_file
         self.transactions_file = transactions_file
-        self.users = self.load_users()
-        self.transactions = self.load_transactions()
-
+        self.fee_engine = fee_engine
+        # Optional partitions.PartitionedLedger used instead of transactions_file.
+        self.ledger = ledger
+        # Optional archive.LedgerArchive holding transactions moved out of the hot set.
+        self.archive = archive
+        # Optional recovery.Journal; every balance change is logged to it first.
+        self.journal = journal
+        self.snapshot_file = snapshot_file
+        # Optional balance_table.BalanceTable; balances then live in its memory-mapped file.
+        self.balance_table = balance_table
+        # Optional user_cache.LazyUserRepository paging users in on demand instead of loading them all.
+        self.user_repository = user_repository
+        # Optional cdc.EventFeed that committed transfers and deposits are published to.
+        self.event_feed = event_feed
+        # Optional limits.VelocityLimiter enforcing per-user hourly/daily caps.
+        self.limiter = limiter
+        # Optional statements.StatementStore given every balance movement for per-user statements.
+        self.statements = statements
+        # Optional analytics.Analytics kept up to date for the operations dashboards.
+        self.analytics = analytics
+        # Optional search_index.SearchIndex over names and phones for support lookups.
+        self.search_index = search_index
+        # Optional occ.VersionedWalletStore shared with other processes; balances and ledger rows
+        # then change only by compare-and-swap, so concurrent writers never lose each other's updates.
+        self.wallet_store = wallet_store
+        self._optimistic = OptimisticTransfers(wallet_store) if wallet_store is not None else None
+        # holds.HoldManager attaches itself here; open holds reduce what transfers can spend.
+        self.holds = None
+        # snapshots.SnapshotManager attaches itself here to version balances for lock-free readers.
+        self.snapshots = None
+        # Why the last transfer() returned None, for messages shown to the user.
+        self.last_failure = None
+        # Fee charged by the last successful transfer().
+        self.last_fee = 0.0
+        self.users = user_repository if user_repository is not None else self.load_users()
+        self.time_index = TimeIndex()
+        self.transactions = []
+        # Epoch microseconds where the loaded ledger partitions begin; older ones are read per query.
+        self._ledger_loaded_from = None
+        for transaction in self.load_transactions():
+            self._record(transaction)
+        self._saved_transactions = len(self.transactions)
+        self._last_transaction_number = max(
+            [transaction_number(t.transaction_id) for t in self.transactions]
+            + [archive.last_number if archive else 0])
+        if journal is not None and not os.path.exists(snapshot_file):
+            write_snapshot(self, snapshot_file)
+        self.rebuild_indexes()
+
+    def rebuild_indexes(self):
+        """Refill the search index, limiter and analytics from the current users and ledger."""
+        if self.search_index is not None:
+            self.search_index.build((u.user_id, u.name, u.phone_number) for u in self.users.values())
+        if self.limiter is not None:
+            recent = datetime.now() - timedelta(seconds=self.limiter.max_window)
+            self.limiter.rebuild(self.transactions_between(recent))
+        if self.analytics is not None:
+            ring_start = datetime.now() - timedelta(seconds=self.analytics.bucket_seconds * self.analytics.size)
+            self.analytics.rebuild(self.transactions_between(ring_start))
+
+    @timed("bkash_load_users")
     def load_users(self):
         users = {}
         if not os.path.exists(self.users_file):
-            self._initialize_file(self.users_file, ["User ID", "Name", "Phone Number", "Balance"])
+            self._initialize_file(self.users_file, USER_HEADERS)
         wb = openpyxl.load_workbook(self.users_file)
         sheet = wb.active
         for row in sheet.iter_rows(min_row=2, values_only=True):
             user_id, name, phone, balance = row
-            users[user_id] = User(user_id, name, phone, Wallet(balance))
+            users[user_id] = User(user_id, name, phone, self._new_wallet(user_id, balance))
         return users
 
+    def _new_wallet(self, user_id, balance):
+        """A Wallet, or a row in the wallet store or slot in the balance table, which keeps its balance."""
+        if self._optimistic is not None:
+            return self._optimistic.wallet(user_id, balance)
+        if self.balance_table is not None:
+            return self.balance_table.wallet(user_id, balance)
+        return Wallet(balance)
+
+    @timed("bkash_save_users")
     def save_users(self):
-        wb = openpyxl.Workbook()
+        if self.user_repository is not None:
+            self.user_repository.flush()
+            return
+        export_users(self.users.values(), self.users_file, "xlsx")
+        registry.gauge("bkash_users").set(len(self.users))
+
+    def _transaction_rows(self):
+        if self.wallet_store is not None:
+            yield from self.wallet_store.transaction_rows()
+            return
+        if self.ledger is not None:
+            start = self.ledger.hot_start()
+            if start is not None:
+                self._ledger_loaded_from = to_epoch_us(start)
+            yield from self.ledger.rows(start)
+            return
+        if not os.path.exists(self.transactions_file):
+            self._initialize_file(self.transactions_file, TRANSACTION_HEADERS)
+        wb = openpyxl.load_workbook(self.transactions_file)
         sheet = wb.active
-        sheet.append(["User ID", "Name", "Phone Number", "Balance"])
-        for user in self.users.values():
-            sheet.append([user.user_id, user.name, user.phone_number, user.wallet.check_balance()])
-        wb.save(self.users_file)
+        yield from sheet.iter_rows(min_row=2, values_only=True)
 
+    @timed("bkash_load_transactions")
     def load_transactions(self):
         transactions = []
-        if not os.path.exists(self.transactions_file):
-            self._initialize_file(self.transactions_file, ["Transaction ID", "Sender ID", "Receiver ID", "Amount", "Date"])
-        wb = openpyxl.load_workbook(self.transactions_file)
-        sheet = wb.active
-        for row in sheet.iter_rows(min_row=2, values_only=True):
+        for row in self._transaction_rows():
             transaction_id, sender_id, receiver_id, amount, date = row
-            sender = self.users.get(sender_id)
-            receiver = self.users.get(receiver_id)
-            if sender and receiver:
-                transactions.append(Transaction(transaction_id, sender, receiver, amount, date))
+            if sender_id in self.users and receiver_id in self.users:
+                transactions.append(Transaction(transaction_id, sender_id, receiver_id, amount, date, self.users))
         return transactions
 
+    @timed("bkash_save_transactions")
     def save_transactions(self):
-        wb = openpyxl.Workbook()
-        sheet = wb.active
-        sheet.append(["Transaction ID", "Sender ID", "Receiver ID", "Amount", "Date"])
-        for t in self.transactions:
-            sheet.append([t.transaction_id, t.sender.user_id, t.receiver.user_id, t.amount, t.date])
-        wb.save(self.transactions_file)
+        if self.wallet_store is not None:
+            pass  # each transfer's rows were committed to the store with its balances
+        elif self.ledger is not None:
+            # Partitioned storage only needs the transactions added since the last save.
+            self.ledger.append(transaction_rows(self.transactions[self._saved_transactions:]))
+        else:
+            export_transactions(self.transactions, self.transactions_file, "xlsx")
+        self._saved_transactions = len(self.transactions)
+        if self.statements is not None:
+            self.statements.flush()
 
     @staticmethod
     def _initialize_file(filename, headers):
@@ -168,13 +288,33 @@ class MobilePaymentSystem(PaymentSystemInterface):
         name = input("Enter Name: ")
         phone = input("Enter Phone Number: ")
         balance = float(input("Enter Initial Balance: "))
-        if user_id in self.users:
-            print("User ID already exists.")
+        if self.add_user(user_id, name, phone, balance) is None:
+            print(self.last_failure)
         else:
-            self.users[user_id] = User(user_id, name, phone, Wallet(balance))
-            self.save_users()
             print("User registered successfully!")
 
+    def add_user(self, user_id, name, phone, balance, persist=True):
+        """Register a new user. Returns the User, or None if the ID is taken or the balance is invalid."""
+        if not self._valid_amount(balance, allow_zero=True):
+            self.last_failure = "Initial balance must be a non-negative number."
+            return None
+        if user_id in self.users:
+            self.last_failure = "User ID already exists."
+            return None
+        user = User(user_id, name, phone, self._new_wallet(user_id, balance))
+        if self.journal is not None:
+            self.journal.log_user(user)
+        if self.snapshots is not None:
+            self.snapshots.before_write((user,), new=True)
+        self.users[user_id] = user
+        if self.snapshots is not None:
+            self.snapshots.publish((user,))
+        if self.search_index is not None:
+            self.search_index.add(user_id, name, phone)
+        if persist:
+            self.save_users()
+        return user
+
     def check_balance(self):
         user_id = input("Enter User ID: ")
         if user_id in self.users:
@@ -183,29 +323,285 @@ class MobilePaymentSystem(PaymentSystemInterface):
         else:
             print("User not found.")
 
+    @timed("bkash_transfer")
+    def transfer(self, sender_id, receiver_id, amount, persist=True, kind="send_money", fee=None):
+        """Move money between two users and record the transaction.
+
+        Returns the new Transaction, or None if the amount is not a positive
+        number, a user is missing or the sender's balance is too low. Batch callers pass persist=False and
+        save once at the end, and may pass a precomputed fee.
+
+        With a fee engine set, the sender is debited amount + fee in one
+        withdrawal and the fee is recorded as its own transaction to the
+        fee revenue account.
+        """
+        with tracer.trace("transfer", sender=sender_id, receiver=receiver_id, amount=amount):
+            with self._pinned((sender_id, receiver_id, FEE_ACCOUNT_ID)):
+                return self._transfer(sender_id, receiver_id, amount, persist, kind, fee)
+
+    def _pinned(self, user_ids):
+        """Keep a user repository from evicting these users while an operation holds them."""
+        if self.user_repository is None:
+            return nullcontext()
+        return self.user_repository.pinned(user_ids)
+
+    def _transfer(self, sender_id, receiver_id, amount, persist, kind, fee):
+        if not self._valid_amount(amount):
+            registry.counter("bkash_transfers_failed_total").inc()
+            self.last_failure = "Amount must be a positive number."
+            return None
+        with tracer.span("lookup"):
+            sender = self.users.get(sender_id)
+            receiver = self.users.get(receiver_id)
+        if sender is None or receiver is None:
+            registry.counter("bkash_transfers_failed_total").inc()
+            self.last_failure = "Sender or Receiver not found."
+            return None
+        with tracer.span("fee"):
+            if fee is None:
+                fee = self.fee_engine.fee(kind, amount) if self.fee_engine else 0.0
+        with tracer.span("balance_check"):
+            available = sender.wallet.check_balance()
+            if self.holds is not None:
+                available -= self.holds.held_amount(sender_id)
+            sufficient = available >= amount + fee
+        if not sufficient:
+            registry.counter("bkash_transfers_failed_total").inc()
+            self.last_failure = "Insufficient balance."
+            return None
+        if self.limiter is not None:
+            with tracer.span("limit_check"):
+                reason = self.limiter.check(sender_id, amount)
+            if reason:
+                registry.counter("bkash_transfers_limited_total").inc()
+                self.last_failure = f"Limit exceeded: {reason}."
+                return None
+        with tracer.span("id_generation"):
+            transaction = Transaction(self._next_transaction_id(), sender_id, receiver_id, amount, users=self.users)
+            fee_id = self._next_transaction_id() if fee else None
+        if self.journal is not None:
+            with tracer.span("journal"):
+                self.journal.log_transfer(transaction, fee, fee_id)
+        fee_transaction = None
+        if fee:
+            fee_account = self._fee_account()
+            fee_transaction = Transaction(fee_id, sender_id, FEE_ACCOUNT_ID, fee, transaction.timestamp, self.users)
+        if self.snapshots is not None:
+            touched = (sender, receiver, fee_account) if fee else (sender, receiver)
+            self.snapshots.before_write(touched)
+        if self._optimistic is not None:
+            with tracer.span("compare_and_swap"):
+                failure = self._swap_balances(transaction, fee_transaction)
+            if failure:
+                if self.snapshots is not None:
+                    self.snapshots.publish(touched)
+                registry.counter("bkash_transfers_failed_total").inc()
+                self.last_failure = failure
+                return None
+        else:
+            with tracer.span("debit"):
+                sender.wallet.withdraw(amount + fee)
+            with tracer.span("credit"):
+                receiver.receive_money(amount)
+                if fee:
+                    fee_account.receive_money(fee)
+        self._record(transaction)
+        if fee_transaction is not None:
+            self._record(fee_transaction)
+        if self.snapshots is not None:
+            self.snapshots.publish(touched)
+        if self.statements is not None:
+            self._record_statements(transaction, fee, fee_id)
+        registry.counter("bkash_transfers_total").inc()
+        self.last_fee = fee
+        if self.limiter is not None:
+            self.limiter.record(sender_id, amount, transaction.timestamp)
+        if self.analytics is not None:
+            self.analytics.record_transfer(sender_id, receiver_id, amount, transaction.timestamp)
+        if persist:
+            with tracer.span("persist"):
+                with tracer.span("save_users"):
+                    self.save_users()
+                with tracer.span("save_transactions"):
+                    self.save_transactions()
+        if self.event_feed is not None:
+            with tracer.span("publish"):
+                self.event_feed.publish_transfer(transaction, fee)
+        return transaction
+
+    def deposit(self, user_id, amount, persist=True):
+        """Add money to a user's wallet (the receive-money path).
+
+        Returns False, with the reason in last_failure, if the amount is not
+        a positive number or the user is unknown.
+        """
+        if not self._valid_amount(amount):
+            self.last_failure = "Amount must be a positive number."
+            return False
+        user = self.users.get(user_id)
+        if user is None:
+            self.last_failure = "User not found."
+            return False
+        timestamp = to_epoch_us(datetime.now())
+        event_id = deposit_id(user_id, timestamp)
+        if self.journal is not None:
+            self.journal.log_deposit(user_id, amount, event_id, timestamp)
+        if self.snapshots is not None:
+            self.snapshots.before_write((user,))
+        user.receive_money(amount)
+        if self.snapshots is not None:
+            self.snapshots.publish((user,))
+        if self.statements is not None:
+            self.statements.record(user_id, timestamp, None, amount, user.wallet.check_balance())
+        if persist:
+            self.save_users()
+        if self.event_feed is not None:
+            self.event_feed.publish_deposit(user_id, amount, timestamp, event_id)
+        return True
+
+    @staticmethod
+    def _valid_amount(amount, allow_zero=False):
+        if isinstance(amount, bool) or not isinstance(amount, (int, float)) or not math.isfinite(amount):
+            return False
+        return amount >= 0 if allow_zero else amount > 0
+
+    def _swap_balances(self, transaction, fee_transaction):
+        """Apply a transfer to the wallet store by compare-and-swap; returns why it failed, or None."""
+        transactions = [t for t in (transaction, fee_transaction) if t is not None]
+        changes = {}
+        for t in transactions:
+            changes[t.sender_id] = changes.get(t.sender_id, 0.0) - t.amount
+            changes[t.receiver_id] = changes.get(t.receiver_id, 0.0) + t.amount
+        try:
+            applied = self._optimistic.apply(changes, list(transaction_rows(transactions)))
+        except VersionConflict:
+            return "Too many concurrent updates, please retry."
+        return None if applied else "Insufficient balance."
+
+    def _record_statements(self, transaction, fee, fee_id):
+        sender_balance = transaction.sender.wallet.check_balance()
+        self.statements.record(transaction.sender_id, transaction.timestamp, transaction.transaction_id,
+                               -transaction.amount, sender_balance + fee)
+        self.statements.record(transaction.receiver_id, transaction.timestamp, transaction.transaction_id,
+                               transaction.amount, transaction.receiver.wallet.check_balance())
+        if fee:
+            fee_account = self._fee_account()
+            self.statements.record(transaction.sender_id, transaction.timestamp, fee_id, -fee, sender_balance)
+            self.statements.record(fee_account.user_id, transaction.timestamp, fee_id, fee,
+                                   fee_account.wallet.check_balance())
+
+    def _record(self, transaction):
+        self.transactions.append(transaction)
+        self.time_index.add(transaction.timestamp, transaction)
+        registry.gauge("bkash_ledger_rows").set(len(self.transactions))
+
+    def _next_transaction_id(self):
+        if self.wallet_store is not None:
+            # Numbers come from the shared store so two processes never issue the same ID.
+            self._last_transaction_number = self.wallet_store.next_transaction_number()
+        else:
+            self._last_transaction_number += 1
+        return f"T{self._last_transaction_number:03d}"
+
+    def transactions_between(self, start=None, end=None):
+        """Transactions dated within [start, end] found by binary search on the time index.
+
+        When the range reaches back past the hot window, matching archived
+        transactions are read back from the archive first, and those in
+        ledger partitions older than the loaded ones from just the
+        partitions the range covers.
+        """
+        hot = self.time_index.between(start, end)
+        start_us = to_epoch_us(start) if start is not None else None
+        rows = []
+        if self.archive is not None and len(self.archive):
+            if start_us is None or start_us <= self.archive.newest_timestamp:
+                rows.extend(self.archive.rows(start, end))
+        loaded_from = self._ledger_loaded_from
+        if loaded_from is not None and (start_us is None or start_us < loaded_from):
+            end_us = loaded_from - 1 if end is None else min(to_epoch_us(end), loaded_from - 1)
+            rows.extend(self.ledger.rows(start, format_epoch_us(end_us)))
+        cold = []
+        for transaction_id, sender_id, receiver_id, amount, date in rows:
+            if sender_id in self.users and receiver_id in self.users:
+                cold.append(Transaction(transaction_id, sender_id, receiver_id, amount, date, self.users))
+        return cold + hot
+
+    def archive_cold_transactions(self, max_age_days=90, now=None):
+        """Move transactions older than max_age_days from memory into the archive.
+
+        With a partitioned ledger only whole partitions are archived, so a
+        partition is never split between hot and cold storage. Returns the
+        number of transactions archived.
+        """
+        if self.archive is None:
+            return 0
+        self.save_transactions()
+        cutoff = to_epoch_us((now or datetime.now()) - timedelta(days=max_age_days))
+        if self.ledger is not None:
+            cutoff_key = self.ledger.partition_key(format_epoch_us(cutoff))
+            is_cold = lambda t: self.ledger.partition_key(t.date) < cutoff_key
+            cold_keys = [key for key in self.ledger.keys_between() if key < cutoff_key]
+            # Read from the partitions, which also hold the cold rows never loaded into memory.
+            last_cold = to_epoch_us(self.ledger.key_start(cutoff_key)) - 1
+            cold = list(self.ledger.rows(end=format_epoch_us(last_cold)))
+        else:
+            is_cold = lambda t: t.timestamp < cutoff
+            cold = list(transaction_rows(t for t in self.transactions if is_cold(t)))
+        if not cold:
+            return 0
+        self.archive.write(cold)
+        hot = [t for t in self.transactions if not is_cold(t)]
+        self.transactions = []
+        self.time_index = TimeIndex()
+        for transaction in hot:
+            self._record(transaction)
+        if self.snapshots is not None:
+            # Snapshots taken earlier keep the old list; new ones see only the hot set.
+            self.snapshots.publish()
+        if self.ledger is not None:
+            self.ledger.drop(cold_keys)
+        else:
+            export_transactions(self.transactions, self.transactions_file, "xlsx")
+        self._saved_transactions = len(self.transactions)
+        if self.journal is not None:
+            # The journal must not replay archived transfers back into the hot set.
+            checkpoint(self, self.snapshot_file)
+        return len(cold)
+
+    def _fee_account(self):
+        account = self.users.get(FEE_ACCOUNT_ID)
+        if account is None:
+            account = User(FEE_ACCOUNT_ID, FEE_ACCOUNT_NAME, "", self._new_wallet(FEE_ACCOUNT_ID, 0.0))
+            self.users[FEE_ACCOUNT_ID] = account
+        return account
+
     def send_money(self):
         sender_id = input("Enter Sender User ID: ")
         receiver_id = input("Enter Receiver User ID: ")
         amount = float(input("Enter Amount: "))
         if sender_id in self.users and receiver_id in self.users:
-            sender = self.users[sender_id]
             receiver = self.users[receiver_id]
-            if sender.wallet.withdraw(amount):
-                receiver.receive_money(amount)
-                transaction_id = f"T{len(self.transactions) + 1:03d}"
-                transaction = Transaction(transaction_id, sender, receiver, amount)
-                self.transactions.append(transaction)
-                self.save_users()
-                self.save_transactions()
-                print(f"Transaction successful! ${amount:.2f} sent to {receiver.name}.")
+            if self.transfer(sender_id, receiver_id, amount):
+                if self.last_fee:
+                    print(f"Transaction successful! ${amount:.2f} sent to {receiver.name} "
+                          f"(fee ${self.last_fee:.2f}).")
+                else:
+                    print(f"Transaction successful! ${amount:.2f} sent to {receiver.name}.")
             else:
-                print("Insufficient balance. Transaction failed.")
+                print(f"{self.last_failure} Transaction failed.")
         else:
             print("Sender or Receiver not found.")
 
+    @timed("bkash_view_transactions")
     def view_transactions(self):
         print("Transaction History:")
-        for t in self.transactions:
+        if self.snapshots is not None:
+            with self.snapshots.snapshot() as snapshot:
+                transactions = list(snapshot.history())
+        else:
+            transactions = self.transactions
+        for t in transactions:
             print(f"{t.sender.name} sent ${t.amount:.2f} to {t.receiver.name} on {t.date}")
 
     def run(self):
@@ -227,8 +623,11 @@ class MobilePaymentSystem(PaymentSystemInterface):
             elif choice == "4":
                 self.view_transactions()
             elif choice == "5":
-                self.save_users()
-                self.save_transactions()
+                if self.journal is not None:
+                    checkpoint(self, self.snapshot_file)
+                else:
+                    self.save_users()
+                    self.save_transactions()
                 print("Exiting... Goodbye!")
                 break
             else:
@@ -236,5 +635,16 @@ class MobilePaymentSystem(PaymentSystemInterface):
 
 
 if __name__ == "__main__":
-    system = MobilePaymentSystem()
+    start_periodic_dump("metrics.prom", interval=60.0)
+    if os.environ.get("BKASH_METRICS_PORT"):
+        start_http_server(int(os.environ["BKASH_METRICS_PORT"]))
+    tracer.sample_rate = float(os.environ.get("BKASH_TRACE_SAMPLE_RATE", "0"))
+    system = MobilePaymentSystem(fee_engine=FeeEngine(), journal=Journal(), event_feed=EventFeed(),
+                                 limiter=VelocityLimiter())
+    if any(True for _ in system.journal.entries()):
+        # A clean exit empties the journal, so leftover entries mean the last run crashed.
+        print(f"Recovered {recover(system, system.snapshot_file)} journal entries from the last run.")
     system.run()
+    registry.dump("metrics.prom")
+    if tracer.traces:
+        tracer.export("trace.json")
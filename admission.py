@@ -0,0 +1,161 @@
+import threading
+import time
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing when the system is saturated; retry_after is in seconds."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Server busy, retry after {retry_after:.3f}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Bounded admission with an AIMD concurrency limit driven by latency.
+
+    At most limit calls run at once and at most max_queue more wait for a
+    slot. Anything beyond that is rejected at once with a retry-after hint,
+    so overload turns into fast rejections, not an ever-growing queue. After
+    each call the limit grows by 1/limit (about +1 per round trip) while
+    latency stays under target_latency. It drops by backoff when latency
+    goes over.
+    """
+
+    def __init__(self, target_latency=0.05, initial_limit=8, min_limit=1, max_limit=256,
+                 max_queue=100, queue_timeout=1.0, backoff=0.9):
+        self.target_latency = target_latency
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.backoff = backoff
+        self.in_flight = 0
+        self.queued = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._average_latency = target_latency
+        self._condition = threading.Condition()
+
+    def retry_after(self):
+        """Rough time for the current queue to drain at the current limit."""
+        return (self.queued + 1) * self._average_latency / max(self.limit, 1)
+
+    def acquire(self):
+        with self._condition:
+            if self.in_flight >= int(self.limit):
+                if self.queued >= self.max_queue:
+                    self.rejected += 1
+                    raise Overloaded(self.retry_after())
+                self.queued += 1
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    while self.in_flight >= int(self.limit):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.rejected += 1
+                            raise Overloaded(self.retry_after())
+                        self._condition.wait(remaining)
+                finally:
+                    self.queued -= 1
+            self.in_flight += 1
+            self.admitted += 1
+
+    def try_acquire(self):
+        """Admit without waiting, or raise Overloaded when limit requests are already outstanding.
+
+        For callers that queue work themselves, such as RequestScheduler. The
+        latency passed to release() then includes queueing time, so the limit
+        shrinks as soon as the queue makes requests late.
+        """
+        with self._condition:
+            if self.in_flight >= int(self.limit):
+                self.rejected += 1
+                raise Overloaded(self.retry_after())
+            self.in_flight += 1
+            self.admitted += 1
+
+    def release(self, latency):
+        with self._condition:
+            self.in_flight -= 1
+            self._average_latency += (latency - self._average_latency) * 0.1
+            if latency > self.target_latency:
+                self.limit = max(self.min_limit, self.limit * self.backoff)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._condition.notify()
+
+    def call(self, function, *args, **kwargs):
+        """Run function under admission control; raises Overloaded when rejected."""
+        self.acquire()
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.release(time.perf_counter() - started)
+
+    def metrics(self):
+        with self._condition:
+            return {"limit": self.limit, "in_flight": self.in_flight, "queued": self.queued,
+                    "admitted": self.admitted, "rejected": self.rejected}
+
+
+def load_test(system, offered_rate, duration=5.0, controller=None, service_time=0.002):
+    """Offer transfers at a fixed rate and report what was served, rejected and how fast.
+
+    Requests go through a RequestScheduler, with the controller (if any) in
+    front of its dispatch, exactly as a server would run them. service_time
+    simulates the per-transfer persistence cost under the core lock, which
+    caps capacity at about 1/service_time transfers per second. Without a
+    controller every request waits its turn, so latency keeps growing for
+    as long as the overload lasts.
+    """
+    from request_scheduler import RequestScheduler
+
+    scheduler = RequestScheduler(admission=controller)
+    user_ids = list(system.users)
+    latencies = []
+    rejected = 0
+
+    def serve():
+        system.transfer(user_ids[0], user_ids[-1], 0.01, persist=False)
+        time.sleep(service_time)
+
+    def finished(arrival):
+        return lambda future: latencies.append(time.perf_counter() - arrival)
+
+    futures = []
+    start = time.perf_counter()
+    sent = 0
+    while time.perf_counter() - start < duration:
+        target = start + sent / offered_rate
+        delay = target - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        sent += 1
+        try:
+            future = scheduler.submit("interactive", serve)
+        except Overloaded:
+            rejected += 1
+            continue
+        future.add_done_callback(finished(time.perf_counter()))
+        futures.append(future)
+    for future in futures:
+        future.result()
+    scheduler.shutdown()
+    latencies.sort()
+    p = lambda fraction: latencies[min(int(fraction * len(latencies)), len(latencies) - 1)] if latencies else 0.0
+    return {"offered": sent, "served": len(latencies), "rejected": rejected,
+            "p50": p(0.50), "p99": p(0.99)}
+
+
+if __name__ == "__main__":
+    from payment_core import create_system
+
+    system = create_system()
+    for label, controller in (("no admission control", None),
+                              ("admission control", AdmissionController(target_latency=0.02))):
+        for rate in (250, 500, 1000):
+            result = load_test(system, rate, duration=3.0, controller=controller)
+            print(f"{label:>22} offered {rate}/s: served={result['served']} rejected={result['rejected']} "
+                  f"p50={result['p50'] * 1000:.1f}ms p99={result['p99'] * 1000:.1f}ms")
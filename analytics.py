@@ -0,0 +1,164 @@
+import hashlib
+import heapq
+from datetime import datetime
+from math import log
+
+from fees import is_fee_leg
+from time_index import format_epoch_us, to_epoch_us
+
+DAY_SECONDS = 86400
+
+
+class HyperLogLog:
+    """Distinct-count estimate in 2**precision one-byte registers (4 KB at the default, ~1.6% error)."""
+
+    __slots__ = ("precision", "size", "registers")
+
+    def __init__(self, precision=12):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(self.size)
+
+    def add(self, value):
+        hashed = int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "little")
+        index = hashed & (self.size - 1)
+        rest = hashed >> self.precision
+        rank = 64 - self.precision - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self):
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size * self.size / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            # Linear counting is more accurate while many registers are still empty.
+            return round(self.size * log(self.size / zeros))
+        return round(estimate)
+
+
+class TopK:
+    """The k keys with the largest running totals, for totals that only grow.
+
+    Exact totals live in a dict. The current top k sit in a min-heap keyed
+    on total, so adding to a key costs O(log k): the key either stays in
+    the top set (new heap entry, old one skipped when popped) or displaces
+    the smallest entry. The heap is compacted when stale entries pile up.
+    """
+
+    def __init__(self, k=10):
+        self.k = k
+        self.totals = {}
+        self.top = {}
+        self._heap = []
+
+    def add(self, key, amount):
+        total = self.totals.get(key, 0.0) + amount
+        self.totals[key] = total
+        if key in self.top or len(self.top) < self.k:
+            self.top[key] = total
+            heapq.heappush(self._heap, (total, key))
+            if len(self._heap) > 4 * self.k:
+                self._heap = [(top_total, top_key) for top_key, top_total in self.top.items()]
+                heapq.heapify(self._heap)
+            return
+        smallest, smallest_key = self._min()
+        if total > smallest:
+            heapq.heapreplace(self._heap, (total, key))
+            del self.top[smallest_key]
+            self.top[key] = total
+
+    def _min(self):
+        while True:
+            total, key = self._heap[0]
+            if self.top.get(key) == total:
+                return total, key
+            heapq.heappop(self._heap)
+
+    def items(self):
+        """(key, total) pairs, largest first."""
+        return sorted(self.top.items(), key=lambda item: item[1], reverse=True)
+
+
+class Analytics:
+    """Live dashboard aggregates fed by each committed transfer.
+
+    Keeps transfer count and amount per time bucket in a ring of the last
+    `buckets` buckets, with a HyperLogLog of the users active in each.
+    Receiver totals for the current day feed a TopK that resets at
+    midnight. record_transfer() is O(1) apart from the O(log k) top-K
+    update, and every view is read from these aggregates without
+    touching the transaction list.
+    """
+
+    def __init__(self, bucket_seconds=3600, buckets=48, top_k=10):
+        self.bucket_seconds = bucket_seconds
+        self.size = buckets
+        self.top_k = top_k
+        self._slots = [None] * buckets
+        self.day = None
+        self.receivers = TopK(top_k)
+        self.users_today = HyperLogLog()
+
+    def _slot(self, bucket):
+        index = bucket % self.size
+        slot = self._slots[index]
+        if slot is None or slot[0] != bucket:
+            if slot is not None and slot[0] > bucket:
+                return None  # its slot already holds a newer bucket
+            slot = [bucket, 0, 0.0, HyperLogLog()]
+            self._slots[index] = slot
+        return slot
+
+    def record_transfer(self, sender_id, receiver_id, amount, timestamp=None):
+        """Add one committed transfer; timestamp is epoch microseconds (default now)."""
+        seconds = (timestamp if timestamp is not None else to_epoch_us(datetime.now())) // 1_000_000
+        slot = self._slot(seconds // self.bucket_seconds)
+        if slot is not None:
+            slot[1] += 1
+            slot[2] += amount
+            slot[3].add(sender_id)
+            slot[3].add(receiver_id)
+        day = seconds // DAY_SECONDS
+        if day != self.day:
+            if self.day is not None and day < self.day:
+                return
+            self.day = day
+            self.receivers = TopK(self.top_k)
+            self.users_today = HyperLogLog()
+        self.receivers.add(receiver_id, amount)
+        self.users_today.add(sender_id)
+        self.users_today.add(receiver_id)
+
+    def rebuild(self, transactions):
+        """Refill the aggregates from transactions, oldest first (e.g. the time index range for the ring)."""
+        self.__init__(self.bucket_seconds, self.size, self.top_k)
+        for transaction in transactions:
+            if not is_fee_leg(transaction):
+                self.record_transfer(transaction.sender_id, transaction.receiver_id,
+                                     transaction.amount, transaction.timestamp)
+
+    def volume(self):
+        """(bucket start date, transfer count, amount) for each non-empty bucket, oldest first."""
+        slots = sorted((slot for slot in self._slots if slot is not None), key=lambda slot: slot[0])
+        return [(format_epoch_us(bucket * self.bucket_seconds * 1_000_000), count, amount)
+                for bucket, count, amount, _ in slots]
+
+    def top_receivers(self):
+        """Today's receivers with the largest amount received, largest first."""
+        return self.receivers.items()
+
+    def active_users(self, buckets=None):
+        """Estimated distinct senders and receivers today, or in the most recent `buckets` buckets."""
+        if buckets is None:
+            return self.users_today.count()
+        slots = sorted((slot for slot in self._slots if slot is not None), key=lambda slot: slot[0],
+                       reverse=True)[:buckets]
+        merged = HyperLogLog()
+        for slot in slots:
+            merged.merge(slot[3])
+        return merged.count()
@@ -0,0 +1,118 @@
+import json
+import os
+import struct
+import zlib
+from bisect import bisect_left, bisect_right
+
+from time_index import to_epoch_us
+
+BLOCK_ROWS = 4096
+FOOTER = struct.Struct("<Q")  # byte offset of the block index at the end of each archive file
+
+
+def transaction_number(transaction_id):
+    """Numeric part of an ID like "T042", or 0 when it has none."""
+    try:
+        return int(str(transaction_id)[1:])
+    except ValueError:
+        return 0
+
+
+class LedgerArchive:
+    """Immutable, compressed, block-indexed files of old transactions.
+
+    Each archive file holds rows sorted by time, cut into zlib-compressed
+    blocks of BLOCK_ROWS rows. A footer index records the first and last
+    timestamp and the byte range of every block, so a range query
+    decompresses only the blocks that overlap it. Files are written once
+    under a temporary name and renamed into place, and never changed again.
+    Rows are stored as [transaction_id, sender_id, receiver_id, amount,
+    epoch microseconds].
+    """
+
+    def __init__(self, directory="archive"):
+        self.directory = directory
+        self.manifest_file = os.path.join(directory, "manifest.json")
+        os.makedirs(directory, exist_ok=True)
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, encoding="utf-8") as f:
+                self.files = json.load(f)["files"]
+        else:
+            self.files = []
+        self._indexes = {}
+
+    @property
+    def last_number(self):
+        return max((info["last_number"] for info in self.files), default=0)
+
+    @property
+    def newest_timestamp(self):
+        return max((info["last"] for info in self.files), default=None)
+
+    def __len__(self):
+        return sum(info["rows"] for info in self.files)
+
+    def write(self, rows, block_rows=BLOCK_ROWS):
+        """Archive rows in a new file and return its manifest entry (None if rows is empty)."""
+        rows = sorted(([r[0], r[1], r[2], r[3], to_epoch_us(r[4])] for r in rows), key=lambda r: r[4])
+        if not rows:
+            return None
+        name = f"archive-{len(self.files) + 1:05d}.bka"
+        path = os.path.join(self.directory, name)
+        index = []
+        with open(path + ".tmp", "wb") as f:
+            for start in range(0, len(rows), block_rows):
+                block = rows[start:start + block_rows]
+                data = zlib.compress(json.dumps(block, separators=(",", ":")).encode("utf-8"))
+                index.append([block[0][4], block[-1][4], f.tell(), len(data)])
+                f.write(data)
+            index_offset = f.tell()
+            f.write(json.dumps(index).encode("utf-8"))
+            f.write(FOOTER.pack(index_offset))
+        os.replace(path + ".tmp", path)
+        info = {"file": name, "first": rows[0][4], "last": rows[-1][4], "rows": len(rows),
+                "last_number": max(transaction_number(r[0]) for r in rows)}
+        self.files.append(info)
+        self._save_manifest()
+        return info
+
+    def _save_manifest(self):
+        with open(self.manifest_file + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"files": self.files}, f, indent=2)
+        os.replace(self.manifest_file + ".tmp", self.manifest_file)
+
+    def _block_index(self, f, name):
+        index = self._indexes.get(name)
+        if index is None:
+            f.seek(-FOOTER.size, os.SEEK_END)
+            footer_start = f.tell()
+            (index_offset,) = FOOTER.unpack(f.read(FOOTER.size))
+            f.seek(index_offset)
+            index = json.loads(f.read(footer_start - index_offset))
+            self._indexes[name] = index
+        return index
+
+    def rows(self, start=None, end=None):
+        """Yield archived rows with start <= time <= end, decompressing only overlapping blocks."""
+        low = to_epoch_us(start) if start is not None else None
+        high = to_epoch_us(end) if end is not None else None
+        for info in self.files:
+            if (low is not None and info["last"] < low) or (high is not None and info["first"] > high):
+                continue
+            yield from self._file_rows(info, low, high)
+
+    def file_rows(self, info):
+        """Yield every row of one archive file, given its manifest entry."""
+        return self._file_rows(info, None, None)
+
+    def _file_rows(self, info, low, high):
+        with open(os.path.join(self.directory, info["file"]), "rb") as f:
+            index = self._block_index(f, info["file"])
+            # Blocks are in time order, so the overlapping ones form a contiguous run.
+            first = 0 if low is None else bisect_left([block[1] for block in index], low)
+            last = len(index) if high is None else bisect_right([block[0] for block in index], high)
+            for _, _, offset, length in index[first:last]:
+                f.seek(offset)
+                for row in json.loads(zlib.decompress(f.read(length))):
+                    if (low is None or row[4] >= low) and (high is None or row[4] <= high):
+                        yield tuple(row)
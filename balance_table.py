@@ -0,0 +1,134 @@
+import mmap
+import os
+import struct
+
+MAGIC = b"BKBAL001"
+HEADER = struct.Struct("<8sqq")  # magic, capacity (slots), count (slots in use)
+HEADER_SIZE = 64  # keeps the int64 array 8-byte aligned with room for future fields
+INITIAL_CAPACITY = 1024
+SCALE = 100  # balances are stored in paisa
+
+
+class MappedWallet:
+    """Wallet whose balance lives in a BalanceTable slot instead of on the object."""
+
+    __slots__ = ("table", "slot")
+
+    def __init__(self, table, slot):
+        self.table = table
+        self.slot = slot
+
+    @property
+    def balance(self):
+        return self.table.values[self.slot] / SCALE
+
+    @balance.setter
+    def balance(self, amount):
+        self.table.values[self.slot] = round(amount * SCALE)
+
+    def deposit(self, amount):
+        self.table.values[self.slot] += round(amount * SCALE)
+
+    def withdraw(self, amount):
+        units = round(amount * SCALE)
+        if self.table.values[self.slot] >= units:
+            self.table.values[self.slot] -= units
+            return True
+        return False
+
+    def check_balance(self):
+        return self.table.values[self.slot] / SCALE
+
+
+class BalanceTable:
+    """Wallet balances as a memory-mapped array of int64 paisa, one dense slot per user.
+
+    path holds a small header and the array. Because it is mapped, every
+    deposit or withdrawal writes straight into the page cache, with no
+    serialisation step, and reopening the table on restart takes no time.
+    path + ".ids" lists the user ID for each slot, one per line. Other
+    processes can open the same file with readonly=True to share the
+    balances without copying them.
+    """
+
+    def __init__(self, path="balances.bin", readonly=False):
+        self.path = path
+        self.readonly = readonly
+        self.ids_path = path + ".ids"
+        if not os.path.exists(path):
+            if readonly:
+                raise FileNotFoundError(path)
+            with open(path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, INITIAL_CAPACITY, 0).ljust(HEADER_SIZE, b"\0"))
+                f.truncate(HEADER_SIZE + INITIAL_CAPACITY * 8)
+        self._file = open(path, "rb" if readonly else "r+b")
+        self._map()
+        self.slots = {}
+        if os.path.exists(self.ids_path):
+            with open(self.ids_path, encoding="utf-8") as f:
+                for slot, line in enumerate(f):
+                    if slot >= self.count:
+                        break  # an ID written just before a crash, whose slot was never claimed
+                    self.slots[line.rstrip("\n")] = slot
+        self._ids_file = None if readonly else open(self.ids_path, "a", encoding="utf-8")
+
+    def _map(self):
+        access = mmap.ACCESS_READ if self.readonly else mmap.ACCESS_WRITE
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=access)
+        magic, self.capacity, self.count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a balance table")
+        self._view = memoryview(self._mmap)
+        self.values = self._view[HEADER_SIZE:HEADER_SIZE + self.capacity * 8].cast("q")
+
+    def _unmap(self):
+        self.values.release()
+        self._view.release()
+        self._mmap.close()
+
+    def _grow(self):
+        capacity = self.capacity * 2
+        self._unmap()
+        self._file.truncate(HEADER_SIZE + capacity * 8)
+        self._file.seek(0)
+        self._file.write(HEADER.pack(MAGIC, capacity, self.count))
+        self._file.flush()
+        self._map()
+
+    def __contains__(self, user_id):
+        return user_id in self.slots
+
+    def __len__(self):
+        return self.count
+
+    def wallet(self, user_id, initial_balance=0.0):
+        """Wallet for user_id, giving the user a new slot seeded with initial_balance if needed."""
+        slot = self.slots.get(user_id)
+        if slot is None:
+            if self.readonly:
+                raise KeyError(user_id)
+            if self.count == self.capacity:
+                self._grow()
+            slot = self.count
+            self.values[slot] = round((initial_balance or 0) * SCALE)
+            self._ids_file.write(f"{user_id}\n")
+            self._ids_file.flush()
+            self.count += 1
+            HEADER.pack_into(self._mmap, 0, MAGIC, self.capacity, self.count)
+            self.slots[user_id] = slot
+        return MappedWallet(self, slot)
+
+    def balance(self, user_id):
+        return self.values[self.slots[user_id]] / SCALE
+
+    def flush(self):
+        """Ask the OS to write dirty pages to disk now (they are written eventually anyway)."""
+        if not self.readonly:
+            self._mmap.flush()
+
+    def close(self):
+        self.flush()
+        self._unmap()
+        self._file.close()
+        if self._ids_file is not None:
+            self._ids_file.close()
@@ -0,0 +1,192 @@
+"""Non-interactive command mode for the payment system.
+
+Usage:
+    python batch.py [commands.jsonl|-] [--checkpoint-every N] [--out FILE]
+
+Each input line is one JSON command; the result of each is written as one
+JSON line, in order:
+
+    {"op": "register", "user_id": "003", "name": "Rahim", "phone": "0171", "balance": 500}
+    {"op": "balance", "user_id": "003"}
+    {"op": "send", "sender": "003", "receiver": "001", "amount": 20}
+    {"op": "receive", "user_id": "003", "amount": 100}
+    {"op": "history", "user_id": "003", "limit": 10}
+
+An optional "id" field is echoed back in the result. Commands run through
+the same MobilePaymentSystem methods as the menus, but nothing is saved per
+command. Every N commands (if --checkpoint-every is given) the journal is
+forced to disk, which costs the same however large the ledger has grown;
+the workbooks are saved once, at the end. Output is buffered and written
+at those same points, so every result written is already durable.
+"""
+import json
+import sys
+
+from cdc import EventFeed
+from fees import FeeEngine
+from limits import VelocityLimiter
+from payment_core import load_core
+from recovery import Journal, checkpoint, recover
+
+HISTORY_LIMIT = 100
+
+
+def _number(value):
+    """float(value), except that JSON true/false stay bools for the system to reject as amounts."""
+    return value if isinstance(value, bool) else float(value)
+
+
+class BatchRunner:
+    """Executes JSON commands against a MobilePaymentSystem with deferred persistence."""
+
+    def __init__(self, system, out=None, checkpoint_every=None):
+        self.system = system
+        self.out = out or sys.stdout
+        self.checkpoint_every = checkpoint_every
+        self._buffer = []
+        self._pending = 0
+        self._unsaved = False
+        self.handlers = {
+            "register": self.register,
+            "balance": self.balance,
+            "send": self.send,
+            "receive": self.receive,
+            "history": self.history,
+        }
+
+    def register(self, command):
+        user = self.system.add_user(str(command["user_id"]), command.get("name", ""),
+                                    str(command.get("phone", "")), _number(command.get("balance", 0.0)),
+                                    persist=False)
+        if user is None:
+            return {"ok": False, "error": self.system.last_failure}
+        return {"ok": True}
+
+    def balance(self, command):
+        user = self.system.users.get(str(command["user_id"]))
+        if user is None:
+            return {"ok": False, "error": "User not found."}
+        return {"ok": True, "balance": user.wallet.check_balance()}
+
+    def send(self, command):
+        transaction = self.system.transfer(str(command["sender"]), str(command["receiver"]),
+                                           _number(command["amount"]), persist=False)
+        if transaction is None:
+            return {"ok": False, "error": self.system.last_failure}
+        return {"ok": True, "transaction_id": transaction.transaction_id}
+
+    def receive(self, command):
+        if not self.system.deposit(str(command["user_id"]), _number(command["amount"]), persist=False):
+            return {"ok": False, "error": self.system.last_failure}
+        return {"ok": True}
+
+    def history(self, command):
+        user_id = command.get("user_id")
+        if user_id is not None:
+            user_id = str(user_id)
+        limit = int(command.get("limit", HISTORY_LIMIT))
+        rows = []
+        # Newest first, stopping at the limit instead of scanning the whole ledger.
+        for t in reversed(self.system.transactions):
+            if len(rows) >= limit:
+                break
+            if user_id is None or user_id in (t.sender_id, t.receiver_id):
+                rows.append([t.transaction_id, t.sender_id, t.receiver_id, t.amount, t.date])
+        return {"ok": True, "transactions": rows}
+
+    def execute(self, command):
+        handler = self.handlers.get(command.get("op"))
+        if handler is None:
+            result = {"ok": False, "error": f"Unknown op: {command.get('op')}"}
+        else:
+            try:
+                result = handler(command)
+            except (KeyError, TypeError, ValueError) as e:
+                result = {"ok": False, "error": f"Bad command: {e!r}"}
+        if "id" in command:
+            result["id"] = command["id"]
+        return result
+
+    def run(self, lines):
+        """Execute every command line and return the number executed."""
+        count = 0
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                command = json.loads(line)
+            except ValueError:
+                result = {"ok": False, "error": "Invalid JSON."}
+            else:
+                if isinstance(command, dict):
+                    result = self.execute(command)
+                else:
+                    result = {"ok": False, "error": "A command must be a JSON object."}
+            self._buffer.append(json.dumps(result))
+            self._pending += 1
+            count += 1
+            if self.checkpoint_every and self._pending >= self.checkpoint_every:
+                self.flush(final=False)
+        self.flush()
+        return count
+
+    def flush(self, final=True):
+        """Make the state durable, then write the results it covers.
+
+        With a journal, an intermediate flush only syncs the journal and the
+        final one takes a full checkpoint. Without one, every flush saves the
+        users and transactions.
+        """
+        if self._pending:
+            self._unsaved = True
+        if self._unsaved:
+            if self.system.journal is None:
+                self.system.save_users()
+                self.system.save_transactions()
+                self._unsaved = False
+            elif final:
+                checkpoint(self.system, self.system.snapshot_file)
+                self._unsaved = False
+            else:
+                self.system.journal.fsync()
+        if self._buffer:
+            self.out.write("\n".join(self._buffer) + "\n")
+            self.out.flush()
+        self._buffer = []
+        self._pending = 0
+
+
+def main(argv):
+    args = [arg for arg in argv if not arg.startswith("--")]
+    checkpoint_every, out_file = None, None
+    if "--checkpoint-every" in argv:
+        value = argv[argv.index("--checkpoint-every") + 1]
+        args.remove(value)
+        checkpoint_every = int(value)
+    if "--out" in argv:
+        out_file = argv[argv.index("--out") + 1]
+        args.remove(out_file)
+    if len(args) > 1:
+        print(__doc__)
+        return 1
+    core = load_core()
+    # Durability comes from the checkpoints, so journal writes skip the per-entry fsync.
+    system = core.MobilePaymentSystem(fee_engine=FeeEngine(), journal=Journal(sync=False),
+                                      event_feed=EventFeed(), limiter=VelocityLimiter())
+    if any(True for _ in system.journal.entries()):
+        recover(system, system.snapshot_file)
+    source = sys.stdin if not args or args[0] == "-" else open(args[0], encoding="utf-8")
+    out = open(out_file, "w", encoding="utf-8") if out_file else sys.stdout
+    try:
+        BatchRunner(system, out, checkpoint_every).run(source)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if out is not sys.stdout:
+            out.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
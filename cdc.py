@@ -0,0 +1,221 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from datetime import datetime
+
+from time_index import to_epoch_us
+
+
+def deposit_id(user_id, timestamp):
+    """Stable ID for a deposit, logged with it so a replayed deposit keeps the same one."""
+    return f"D{timestamp}-{user_id}"
+
+
+def transfer_id(sender_id, timestamp):
+    """Event ID for a transfer from a script whose transaction IDs restart at T001 on every run."""
+    return f"T{timestamp}-{sender_id}"
+
+
+class EventFeed:
+    """Append-only JSON-lines log of committed ledger events.
+
+    The payment system publishes one event per committed transfer or
+    deposit. Consumers read the file from their own saved position, so
+    publishing never waits on a slow consumer. Backpressure is pull-based:
+    a consumer only gets the next batch when it asks for one.
+
+    Every event carries an event_id that stays the same if the event is
+    published again (the transaction ID, or the deposit's ID), so consumers
+    can deduplicate; the sequence number only orders the file.
+    """
+
+    def __init__(self, path="events.log"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._drop_torn_line()
+        self._file = open(path, "a", encoding="utf-8")
+        self.sequence = self._last_sequence()
+
+    def _drop_torn_line(self):
+        # A crash mid-write leaves a partial last line; appending after it would corrupt the next event.
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, "rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(size - 4096, 0))
+            tail = f.read()
+            if not tail.endswith(b"\n"):
+                f.truncate(size - len(tail) + tail.rfind(b"\n") + 1)
+
+    def _last_sequence(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return 0
+        with open(self.path, "rb") as f:
+            f.seek(max(os.path.getsize(self.path) - 4096, 0))
+            lines = [line for line in f.read().splitlines() if line.strip()]
+        try:
+            return json.loads(lines[-1])["sequence"]
+        except (IndexError, ValueError, KeyError):
+            return 0
+
+    def publish(self, event_type, event_id, **fields):
+        with self._lock:
+            self.sequence += 1
+            event = {"sequence": self.sequence, "event_id": event_id, "type": event_type, **fields}
+            self._file.write(json.dumps(event) + "\n")
+            self._file.flush()
+        return event
+
+    def publish_transfer(self, transaction, fee=0.0):
+        return self.publish("transfer", transaction.transaction_id, transaction_id=transaction.transaction_id,
+                            sender=transaction.sender_id, receiver=transaction.receiver_id,
+                            amount=transaction.amount, fee=fee, timestamp=transaction.timestamp)
+
+    def publish_deposit(self, user_id, amount, timestamp=None, event_id=None):
+        if timestamp is None:
+            timestamp = to_epoch_us(datetime.now())
+        return self.publish("deposit", event_id or deposit_id(user_id, timestamp), user_id=user_id,
+                            amount=amount, timestamp=timestamp)
+
+    def position(self):
+        """Byte offset of the end of the feed; events published later start at or after it."""
+        with self._lock:
+            return self._file.tell()
+
+    def event_ids(self, position=0):
+        """IDs of the events published from position onwards."""
+        ids = set()
+        if not os.path.exists(self.path):
+            return ids
+        with open(self.path, "rb") as f:
+            f.seek(position)
+            for line in f:
+                if line.endswith(b"\n") and line.strip():
+                    ids.add(json.loads(line).get("event_id"))
+        return ids
+
+    def close(self):
+        self._file.close()
+
+
+class FeedConsumer:
+    """Reads a feed file from a per-consumer byte offset kept in offsets_dir/<name>."""
+
+    def __init__(self, name, path="events.log", offsets_dir="events.offsets"):
+        self.name = name
+        self.path = path
+        self.offset_file = os.path.join(offsets_dir, name)
+        os.makedirs(offsets_dir, exist_ok=True)
+        self.position = 0
+        if os.path.exists(self.offset_file):
+            with open(self.offset_file, encoding="utf-8") as f:
+                self.position = int(f.read().strip() or 0)
+
+    def poll(self, max_events=1000):
+        """Return (events, next_position) for up to max_events events after the committed offset.
+
+        Only complete lines are returned; a line still being written is left
+        for the next poll.
+        """
+        events = []
+        position = self.position
+        if not os.path.exists(self.path):
+            return events, position
+        with open(self.path, "rb") as f:
+            f.seek(position)
+            while len(events) < max_events:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break
+                position += len(line)
+                if line.strip():
+                    events.append(json.loads(line))
+        return events, position
+
+    def commit(self, position):
+        with open(self.offset_file + ".tmp", "w", encoding="utf-8") as f:
+            f.write(str(position))
+        os.replace(self.offset_file + ".tmp", self.offset_file)
+        self.position = position
+
+    def follow(self, max_events=1000, idle_sleep=0.2):
+        """Yield batches forever, committing each one after the caller has handled it."""
+        while True:
+            events, position = self.poll(max_events)
+            if events:
+                yield events
+                self.commit(position)
+            else:
+                time.sleep(idle_sleep)
+
+
+class _FeedRequestHandler(socketserver.StreamRequestHandler):
+    # One JSON request per line:
+    #   {"consumer": name, "poll": max_events}  -> {"events": [...], "next": position}
+    #   {"consumer": name, "commit": position}  -> {"committed": position}
+    def handle(self):
+        for line in self.rfile:
+            request = json.loads(line)
+            consumer = self.server.consumer(request["consumer"])
+            if "commit" in request:
+                consumer.commit(request["commit"])
+                reply = {"committed": request["commit"]}
+            else:
+                events, position = consumer.poll(request.get("poll", 1000))
+                reply = {"events": events, "next": position}
+            self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+
+
+class FeedServer(socketserver.ThreadingUnixStreamServer):
+    """Serves a feed to consumers over a local Unix socket, with the same offsets as FeedConsumer."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path="events.sock", path="events.log", offsets_dir="events.offsets"):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        self.feed_path = path
+        self.offsets_dir = offsets_dir
+        self._consumers = {}
+        self._consumers_lock = threading.Lock()
+        super().__init__(socket_path, _FeedRequestHandler)
+
+    def consumer(self, name):
+        with self._consumers_lock:
+            if name not in self._consumers:
+                self._consumers[name] = FeedConsumer(name, self.feed_path, self.offsets_dir)
+            return self._consumers[name]
+
+
+class SocketConsumer:
+    """Client side of FeedServer with the same poll/commit calls as FeedConsumer."""
+
+    def __init__(self, name, socket_path="events.sock"):
+        self.name = name
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(socket_path)
+        self._reader = self._socket.makefile("r", encoding="utf-8")
+
+    def _request(self, **fields):
+        self._socket.sendall((json.dumps({"consumer": self.name, **fields}) + "\n").encode("utf-8"))
+        return json.loads(self._reader.readline())
+
+    def poll(self, max_events=1000):
+        reply = self._request(poll=max_events)
+        return reply["events"], reply["next"]
+
+    def commit(self, position):
+        self._request(commit=position)
+
+    def close(self):
+        self._reader.close()
+        self._socket.close()
+
+
+if __name__ == "__main__":
+    server = FeedServer()
+    print(f"Serving events.log on {server.server_address}")
+    server.serve_forever()
@@ -0,0 +1,99 @@
+import csv
+import json
+import os
+
+import openpyxl
+
+USER_HEADERS = ["User ID", "Name", "Phone Number", "Balance"]
+TRANSACTION_HEADERS = ["Transaction ID", "Sender ID", "Receiver ID", "Amount", "Date"]
+
+
+def user_rows(users):
+    for user in users:
+        yield [user.user_id, user.name, user.phone_number, user.wallet.check_balance()]
+
+
+def transaction_rows(transactions):
+    for t in transactions:
+        yield [t.transaction_id, t.sender_id, t.receiver_id, t.amount, t.date]
+
+
+def print_progress(count):
+    print(f"Exported {count} rows...")
+
+
+def _counted(rows, progress, progress_every, counter):
+    for row in rows:
+        yield row
+        counter[0] += 1
+        if progress and counter[0] % progress_every == 0:
+            progress(counter[0])
+
+
+def export_rows(rows, filename, headers, fmt=None, progress=None, progress_every=100000):
+    """Stream rows from any iterable to an .xlsx, .csv or .jsonl file.
+
+    Rows are written as they are produced, so memory stays flat however many
+    there are: xlsx output uses openpyxl's write-only mode, which serialises
+    each row instead of keeping cell objects. The format comes from the file
+    extension unless fmt is given. progress(count) is called every
+    progress_every rows. The file is written under a temporary name and
+    renamed over the target, so a crash mid-write leaves the previous file
+    intact. Returns the number of rows written.
+    """
+    fmt = fmt or os.path.splitext(filename)[1].lstrip(".").lower()
+    counter = [0]
+    rows = _counted(rows, progress, progress_every, counter)
+    temp_file = filename + ".tmp"
+
+    if fmt == "xlsx":
+        wb = openpyxl.Workbook(write_only=True)
+        sheet = wb.create_sheet()
+        sheet.append(headers)
+        for row in rows:
+            sheet.append(row)
+        wb.save(temp_file)
+    elif fmt == "csv":
+        with open(temp_file, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(headers)
+            writer.writerows(rows)
+    elif fmt in ("jsonl", "json"):
+        with open(temp_file, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(dict(zip(headers, row))) + "\n")
+    else:
+        raise ValueError(f"Unsupported export format: {fmt}")
+    os.replace(temp_file, filename)
+    return counter[0]
+
+
+def export_users(users, filename, fmt=None, progress=None):
+    return export_rows(user_rows(users), filename, USER_HEADERS, fmt, progress)
+
+
+def export_transactions(transactions, filename, fmt=None, progress=None):
+    return export_rows(transaction_rows(transactions), filename, TRANSACTION_HEADERS, fmt, progress)
+
+
+def workbook_rows(filename):
+    """Yield the data rows of a workbook without loading it all into memory."""
+    wb = openpyxl.load_workbook(filename, read_only=True)
+    try:
+        yield from wb.active.iter_rows(min_row=2, values_only=True)
+    finally:
+        wb.close()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python export.py <users.xlsx|transactions.xlsx> <output.xlsx|.csv|.jsonl>")
+        sys.exit(1)
+    source, target = sys.argv[1], sys.argv[2]
+    wb = openpyxl.load_workbook(source, read_only=True)
+    headers = list(next(wb.active.iter_rows(max_row=1, values_only=True)))
+    wb.close()
+    count = export_rows(workbook_rows(source), target, headers, progress=print_progress)
+    print(f"Exported {count} rows to {target}.")
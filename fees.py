@@ -0,0 +1,69 @@
+from bisect import bisect_left
+
+try:
+    import numpy as np
+except ImportError:  # numpy only speeds up batch fee calculation
+    np = None
+
+FEE_ACCOUNT_ID = "FEE"
+FEE_ACCOUNT_NAME = "Fee Revenue"
+
+
+def is_fee_leg(transaction):
+    """True for the ledger row that moves a transfer's fee to the fee account.
+
+    The fee leg belongs to the transfer it was charged on, so anything that
+    counts transfers (analytics, velocity limits) should skip it.
+    """
+    return transaction.receiver_id == FEE_ACCOUNT_ID
+
+# Tier tables per transfer kind: (upper amount bound, flat fee, percent fee).
+# A tier covers amounts up to and including its bound; None means no upper bound.
+FEE_TABLES = {
+    "send_money": [(100, 0.0, 0.0), (25000, 5.0, 0.0), (None, 10.0, 0.0)],
+    "cash_out": [(None, 0.0, 1.85)],
+    "merchant_payment": [(1000, 0.0, 0.0), (None, 0.0, 1.5)],
+}
+
+
+class FeeTable:
+    """A tier table compiled into parallel sorted arrays for bisect lookups."""
+
+    def __init__(self, tiers):
+        tiers = sorted(tiers, key=lambda tier: float("inf") if tier[0] is None else tier[0])
+        if tiers[-1][0] is not None:
+            raise ValueError("The last fee tier must have no upper bound (None).")
+        self.bounds = [bound for bound, _, _ in tiers[:-1]]
+        self.flat = [flat for _, flat, _ in tiers]
+        self.rate = [percent / 100 for _, _, percent in tiers]
+        if np is not None:
+            self._np_bounds = np.array(self.bounds, dtype=float)
+            self._np_flat = np.array(self.flat, dtype=float)
+            self._np_rate = np.array(self.rate, dtype=float)
+
+    def fee(self, amount):
+        tier = bisect_left(self.bounds, amount)
+        return round(self.flat[tier] + amount * self.rate[tier], 2)
+
+    def fees(self, amounts):
+        """Fees for many amounts at once; vectorized when numpy is installed."""
+        if np is None:
+            return [self.fee(amount) for amount in amounts]
+        amounts = np.asarray(amounts, dtype=float)
+        tiers = np.searchsorted(self._np_bounds, amounts, side="left")
+        return np.round(self._np_flat[tiers] + amounts * self._np_rate[tiers], 2).tolist()
+
+
+class FeeEngine:
+    """Looks up tiered fees by transfer kind. Unknown kinds are free."""
+
+    def __init__(self, tables=None):
+        self.tables = {kind: FeeTable(tiers) for kind, tiers in (tables or FEE_TABLES).items()}
+
+    def fee(self, kind, amount):
+        table = self.tables.get(kind)
+        return table.fee(amount) if table else 0.0
+
+    def fees(self, kind, amounts):
+        table = self.tables.get(kind)
+        return table.fees(amounts) if table else [0.0] * len(amounts)
@@ -0,0 +1,128 @@
+import heapq
+from datetime import datetime, timedelta
+
+from time_index import to_epoch_us
+
+DEFAULT_HOLD_TTL = timedelta(days=7)
+
+
+class Hold:
+    """Funds reserved on a payer's wallet for a merchant until captured, released or expired.
+
+    fee is the merchant-payment fee reserved on top of amount, so reserved
+    is what the capture can debit at most.
+    """
+
+    __slots__ = ("hold_id", "user_id", "merchant_id", "amount", "fee", "expires_at")
+
+    def __init__(self, hold_id, user_id, merchant_id, amount, expires_at, fee=0.0):
+        self.hold_id = hold_id
+        self.user_id = user_id
+        self.merchant_id = merchant_id
+        self.amount = amount
+        self.fee = fee
+        self.expires_at = expires_at
+
+    @property
+    def reserved(self):
+        return self.amount + self.fee
+
+
+class HoldManager:
+    """Authorize/capture reservations for merchant checkouts.
+
+    A hold lowers the payer's available balance (balance minus held) but
+    leaves the ledger balance alone. A running held total per user keeps
+    available() O(1) however many holds are open. Expiry uses a min-heap on
+    expiry time, so expire_due() pops only the holds that are due. Captured
+    or released holds are skipped when they reach the top of the heap.
+    """
+
+    def __init__(self, system, default_ttl=DEFAULT_HOLD_TTL):
+        self.system = system
+        self.default_ttl = default_ttl
+        self.holds = {}
+        self.held = {}
+        self._expiry = []
+        self._last_id = 0
+        system.holds = self
+
+    def held_amount(self, user_id):
+        return self.held.get(user_id, 0.0)
+
+    def available(self, user_id):
+        return self.system.users[user_id].wallet.check_balance() - self.held.get(user_id, 0.0)
+
+    def _fee(self, amount):
+        fee_engine = self.system.fee_engine
+        return fee_engine.fee("merchant_payment", amount) if fee_engine else 0.0
+
+    def hold(self, user_id, merchant_id, amount, ttl=None, now=None):
+        """Reserve amount plus its merchant-payment fee for merchant_id.
+
+        Returns the Hold, or None if funds or users are missing.
+        """
+        now = now or datetime.now()
+        self.expire_due(now)
+        if user_id not in self.system.users or merchant_id not in self.system.users:
+            return None
+        if amount <= 0:
+            return None
+        fee = self._fee(amount)
+        if self.available(user_id) < amount + fee:
+            return None
+        self._last_id += 1
+        expires_at = to_epoch_us(now + (ttl or self.default_ttl))
+        hold = Hold(f"H{self._last_id:03d}", user_id, merchant_id, amount, expires_at, fee)
+        self.holds[hold.hold_id] = hold
+        self.held[user_id] = self.held.get(user_id, 0.0) + hold.reserved
+        heapq.heappush(self._expiry, (expires_at, hold.hold_id))
+        return hold
+
+    def _remove(self, hold_id):
+        hold = self.holds.pop(hold_id, None)
+        if hold is not None:
+            remaining = self.held[hold.user_id] - hold.reserved
+            if remaining > 1e-9:
+                self.held[hold.user_id] = remaining
+            else:
+                del self.held[hold.user_id]
+        return hold
+
+    def release(self, hold_id):
+        return self._remove(hold_id) is not None
+
+    def capture(self, hold_id, amount=None, persist=True):
+        """Settle a hold as a merchant payment, for its full amount or a smaller one.
+
+        The fee is charged for the captured amount but never more than the
+        fee reserved with the hold. Any uncaptured remainder is released.
+        Returns the Transaction, or None if the hold is unknown or expired,
+        or the transfer fails.
+        """
+        self.expire_due()
+        # The hold is dropped before the transfer so its own reservation does not block it.
+        hold = self._remove(hold_id)
+        if hold is None:
+            return None
+        amount = hold.amount if amount is None else min(amount, hold.amount)
+        fee = hold.fee if amount == hold.amount else min(self._fee(amount), hold.fee)
+        transaction = self.system.transfer(hold.user_id, hold.merchant_id, amount, persist=persist,
+                                           kind="merchant_payment", fee=fee)
+        if transaction is None:
+            # Put the reservation back so the merchant can retry before it expires.
+            self.holds[hold.hold_id] = hold
+            self.held[hold.user_id] = self.held.get(hold.user_id, 0.0) + hold.reserved
+        return transaction
+
+    def expire_due(self, now=None):
+        """Release every hold past its expiry; returns the expired hold IDs."""
+        now_us = to_epoch_us(now or datetime.now())
+        expired = []
+        while self._expiry and self._expiry[0][0] <= now_us:
+            expires_at, hold_id = heapq.heappop(self._expiry)
+            hold = self.holds.get(hold_id)
+            if hold is not None and hold.expires_at == expires_at:
+                self._remove(hold_id)
+                expired.append(hold_id)
+        return expired
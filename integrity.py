@@ -0,0 +1,288 @@
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+
+import openpyxl
+
+CHUNK_BYTES = 8 * 1024 * 1024
+TOLERANCE = 1e-6
+SHEET_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_SHARED_STRINGS = []
+
+
+class ChunkSummary:
+    """Partial results for one contiguous slice of the ledger.
+
+    For each user, net is the total balance change over the slice and
+    min_prefix the lowest running change reached inside it. Two adjacent
+    slices combine as net = a.net + b.net and
+    min_prefix = min(a.min_prefix, a.net + b.min_prefix), so chunks can be
+    checked independently and merged in ledger order.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.ids = set()
+        self.duplicate_ids = set()
+        self.bad_rows = []
+        self.net = {}
+        self.min_prefix = {}
+
+    def add_row(self, row):
+        self.rows += 1
+        transaction_id, sender_id, receiver_id, amount = row[:4]
+        if transaction_id in self.ids:
+            self.duplicate_ids.add(transaction_id)
+        self.ids.add(transaction_id)
+        if not isinstance(amount, (int, float)) or amount <= 0:
+            self.bad_rows.append(transaction_id)
+            return
+        for user_id, change in ((sender_id, -amount), (receiver_id, amount)):
+            running = self.net.get(user_id, 0) + change
+            self.net[user_id] = running
+            if running < self.min_prefix.get(user_id, 0):
+                self.min_prefix[user_id] = running
+
+    def merge(self, later):
+        """Fold in the summary of the slice that comes right after this one."""
+        self.rows += later.rows
+        self.duplicate_ids |= later.duplicate_ids | (self.ids & later.ids)
+        self.ids |= later.ids
+        self.bad_rows += later.bad_rows
+        for user_id, later_min in later.min_prefix.items():
+            candidate = self.net.get(user_id, 0) + later_min
+            if candidate < self.min_prefix.get(user_id, 0):
+                self.min_prefix[user_id] = candidate
+        for user_id, change in later.net.items():
+            self.net[user_id] = self.net.get(user_id, 0) + change
+        return self
+
+
+class IntegrityReport:
+    """Outcome of a full ledger check; ok is True when nothing was found."""
+
+    def __init__(self):
+        self.rows = 0
+        self.duplicate_ids = []
+        self.bad_rows = []
+        self.unknown_users = []
+        self.negative_balances = {}
+        self.mismatched_balances = {}
+        self.conservation_error = 0.0
+
+    @property
+    def ok(self):
+        return not (self.duplicate_ids or self.bad_rows or self.unknown_users or self.negative_balances
+                    or self.mismatched_balances or abs(self.conservation_error) > TOLERANCE)
+
+    def display(self):
+        lines = [f"Rows checked: {self.rows}",
+                 f"Duplicate transaction IDs: {len(self.duplicate_ids)} {self.duplicate_ids[:10]}",
+                 f"Rows with invalid amounts: {len(self.bad_rows)} {self.bad_rows[:10]}",
+                 f"Unknown users: {len(self.unknown_users)} {self.unknown_users[:10]}",
+                 f"Wallets that went negative: {len(self.negative_balances)}",
+                 f"Balances not matching opening + movements: {len(self.mismatched_balances)}",
+                 f"Money not conserved by: {self.conservation_error:.2f}",
+                 "Ledger OK." if self.ok else "Ledger has problems."]
+        for user_id, lowest in list(self.negative_balances.items())[:10]:
+            lines.insert(5, f"  {user_id} reached {lowest:.2f}")
+        return "\n".join(lines)
+
+
+def load_balances(filename):
+    wb = openpyxl.load_workbook(filename, read_only=True)
+    try:
+        return {row[0]: row[3] or 0 for row in wb.active.iter_rows(min_row=2, values_only=True)}
+    finally:
+        wb.close()
+
+
+def summarize_rows(rows):
+    summary = ChunkSummary()
+    for row in rows:
+        summary.add_row(row)
+    return summary
+
+
+def _sheet_name(archive):
+    return sorted(name for name in archive.namelist() if name.startswith("xl/worksheets/sheet"))[0]
+
+
+def shared_strings(filename):
+    """The workbook's shared string table (empty for the inline strings our exports write)."""
+    with zipfile.ZipFile(filename) as archive:
+        if "xl/sharedStrings.xml" not in archive.namelist():
+            return []
+        root = ElementTree.fromstring(archive.read("xl/sharedStrings.xml"))
+        return ["".join(item.itertext()) for item in root]
+
+
+def xml_row_chunks(filename, chunk_bytes=CHUNK_BYTES):
+    """Yield the raw <row> XML of the first sheet in pieces of about chunk_bytes, cut between rows.
+
+    Only decompression and a search for the last </row> happen here; the
+    XML itself is parsed by whoever consumes the chunks.
+    """
+    with zipfile.ZipFile(filename) as archive, archive.open(_sheet_name(archive)) as f:
+        buffer = b""
+        started = False
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                return
+            buffer += block
+            if not started:
+                start = buffer.find(b"<sheetData>")
+                if start < 0:
+                    continue
+                buffer = buffer[start + len(b"<sheetData>"):]
+                started = True
+            cut = buffer.rfind(b"</row>")
+            if cut >= 0:
+                cut += len(b"</row>")
+                yield buffer[:cut]
+                buffer = buffer[cut:]
+
+
+def _cell_value(cell, shared):
+    kind = cell.get("t")
+    if kind == "inlineStr":
+        return "".join(cell.itertext())
+    value = cell.findtext(f"{{{SHEET_NS}}}v")
+    if value is None:
+        return None
+    if kind == "s":
+        return shared[int(value)]
+    if kind in ("str", "e"):
+        return value
+    if kind == "b":
+        return value == "1"
+    number = float(value)
+    return int(number) if number.is_integer() and "." not in value and "E" not in value else number
+
+
+def parse_rows(chunk, shared=()):
+    """Yield (A, B, C, D, E) value tuples for the data rows in a chunk from xml_row_chunks."""
+    root = ElementTree.fromstring(b'<sheetData xmlns="' + SHEET_NS.encode() + b'">' + chunk + b"</sheetData>")
+    for row in root:
+        if row.get("r") == "1":
+            continue  # header
+        values = [None] * 5
+        for position, cell in enumerate(row):
+            reference = cell.get("r")
+            column = position if reference is None else ord(reference[0]) - ord("A")
+            if column < 5 and (reference is None or reference[1].isdigit()):
+                values[column] = _cell_value(cell, shared)
+        yield tuple(values)
+
+
+def _init_worker(strings):
+    global _SHARED_STRINGS
+    _SHARED_STRINGS = strings
+
+
+def summarize_chunk(chunk):
+    """Worker entry point: parse and summarise one slice of sheet XML."""
+    return summarize_rows(parse_rows(chunk, _SHARED_STRINGS))
+
+
+def summarize_workbook(filename):
+    """Worker entry point: read and summarise one partition file in its own process."""
+    strings = shared_strings(filename)
+    total = ChunkSummary()
+    for chunk in xml_row_chunks(filename):
+        total.merge(summarize_rows(parse_rows(chunk, strings)))
+    return total
+
+
+def summarize_archive_file(job):
+    """Worker entry point: summarise one LedgerArchive file."""
+    from archive import LedgerArchive
+
+    directory, info = job
+    return summarize_rows(LedgerArchive(directory).file_rows(info))
+
+
+def _ordered_map(pool, function, items, window):
+    """Like pool.map, but keeps at most window tasks in flight so chunks are not all read up front."""
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(function, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def check_ledger(users_file="users.xlsx", transactions_file="transactions.xlsx", ledger=None,
+                 opening_file=None, workers=None, chunk_bytes=CHUNK_BYTES, archive=None):
+    """Verify the whole ledger using a pool of worker processes.
+
+    With a partitions.PartitionedLedger each worker parses whole partition
+    files. Otherwise the parent only decompresses the single workbook's
+    sheet XML and cuts it between rows into chunk_bytes slices, which the
+    workers parse and summarise. Rows moved to an archive.LedgerArchive
+    are older than any hot row, so each archive file is summarised first.
+    The chunk summaries are merged in ledger order.
+
+    Opening balances come from opening_file (a users workbook saved before
+    the ledger started) when given. Otherwise they are derived as final
+    balance minus net movement, and a negative derived opening balance
+    counts as money created from nothing.
+    """
+    workers = workers or os.cpu_count() or 1
+    strings = shared_strings(transactions_file) if ledger is None else []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(strings,)) as pool:
+        total = ChunkSummary()
+        if archive is not None:
+            jobs = [(archive.directory, info) for info in archive.files]
+            for summary in _ordered_map(pool, summarize_archive_file, jobs, workers * 2):
+                total.merge(summary)
+        if ledger is not None:
+            paths = [ledger._path(key) for key in ledger.keys_between()]
+            summaries = _ordered_map(pool, summarize_workbook, paths, workers * 2)
+        else:
+            summaries = _ordered_map(pool, summarize_chunk, xml_row_chunks(transactions_file, chunk_bytes),
+                                     workers * 2)
+        for summary in summaries:
+            total.merge(summary)
+
+    final = load_balances(users_file)
+    report = IntegrityReport()
+    report.rows = total.rows
+    report.duplicate_ids = sorted(total.duplicate_ids)
+    report.bad_rows = total.bad_rows
+    report.unknown_users = sorted(user_id for user_id in total.net if user_id not in final)
+
+    if opening_file is not None:
+        opening = load_balances(opening_file)
+        report.conservation_error = sum(final.values()) - sum(opening.values())
+        for user_id, balance in final.items():
+            expected = opening.get(user_id, 0) + total.net.get(user_id, 0)
+            if abs(expected - balance) > TOLERANCE:
+                report.mismatched_balances[user_id] = (expected, balance)
+    else:
+        opening = {user_id: balance - total.net.get(user_id, 0) for user_id, balance in final.items()}
+        report.conservation_error = sum(min(balance, 0) for balance in opening.values())
+
+    for user_id, lowest_change in total.min_prefix.items():
+        lowest = opening.get(user_id, 0) + lowest_change
+        if lowest < -TOLERANCE:
+            report.negative_balances[user_id] = lowest
+    return report
+
+
+if __name__ == "__main__":
+    import sys
+
+    from archive import LedgerArchive
+    from partitions import PartitionedLedger
+
+    ledger = PartitionedLedger() if os.path.isdir("transactions") else None
+    archive = LedgerArchive() if os.path.isdir("archive") else None
+    opening_file = sys.argv[1] if len(sys.argv) > 1 else None
+    result = check_ledger(ledger=ledger, opening_file=opening_file, archive=archive)
+    print(result.display())
+    sys.exit(0 if result.ok else 1)
@@ -0,0 +1,114 @@
+from datetime import datetime
+
+from fees import is_fee_leg
+from time_index import to_epoch_us
+
+# name: (window seconds, bucket seconds, max transfers, max amount)
+DEFAULT_RULES = {
+    "hourly": (3600, 60, 20, 50000.0),
+    "daily": (86400, 3600, 50, 200000.0),
+}
+
+
+class SlidingWindowCounter:
+    """Count and amount over the last window seconds, kept in a ring of fixed-size buckets.
+
+    Totals are updated as buckets are filled and expired. Reads and writes
+    touch only the buckets that went stale since the previous call, at most
+    one full ring, so every operation is O(1) in the number of transfers.
+    """
+
+    __slots__ = ("bucket_seconds", "size", "counts", "amounts", "count", "amount", "last_bucket")
+
+    def __init__(self, window_seconds, bucket_seconds):
+        self.bucket_seconds = bucket_seconds
+        self.size = max(window_seconds // bucket_seconds, 1)
+        self.counts = [0] * self.size
+        self.amounts = [0.0] * self.size
+        self.count = 0
+        self.amount = 0.0
+        self.last_bucket = None
+
+    def _advance(self, bucket):
+        if self.last_bucket is None or bucket - self.last_bucket >= self.size:
+            self.counts = [0] * self.size
+            self.amounts = [0.0] * self.size
+            self.count = 0
+            self.amount = 0.0
+        elif bucket > self.last_bucket:
+            for stale in range(self.last_bucket + 1, bucket + 1):
+                index = stale % self.size
+                self.count -= self.counts[index]
+                self.amount -= self.amounts[index]
+                self.counts[index] = 0
+                self.amounts[index] = 0.0
+        else:
+            return
+        self.last_bucket = bucket
+
+    def totals(self, seconds):
+        self._advance(seconds // self.bucket_seconds)
+        return self.count, self.amount
+
+    def add(self, seconds, amount):
+        bucket = seconds // self.bucket_seconds
+        self._advance(bucket)
+        if bucket <= self.last_bucket - self.size:
+            return  # older than the window; only happens while rebuilding from history
+        index = bucket % self.size
+        self.counts[index] += 1
+        self.amounts[index] += amount
+        self.count += 1
+        self.amount += amount
+
+
+class VelocityLimiter:
+    """Per-user hourly/daily transfer caps checked before each withdrawal.
+
+    Each user with recent activity gets one SlidingWindowCounter per rule.
+    check() and record() are a dict lookup plus O(1) counter work, a few
+    microseconds per transfer. rebuild() warms the counters from recent
+    ledger history at startup.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = rules or DEFAULT_RULES
+        self.max_window = max(window for window, _, _, _ in self.rules.values())
+        self.counters = {}
+
+    def _counters(self, user_id):
+        counters = self.counters.get(user_id)
+        if counters is None:
+            counters = [(name, SlidingWindowCounter(window, bucket), max_count, max_amount)
+                        for name, (window, bucket, max_count, max_amount) in self.rules.items()]
+            self.counters[user_id] = counters
+        return counters
+
+    @staticmethod
+    def _seconds(when):
+        return to_epoch_us(when if when is not None else datetime.now()) // 1_000_000
+
+    def check(self, user_id, amount, when=None):
+        """Return None if the transfer fits every limit, otherwise a reason string."""
+        seconds = self._seconds(when)
+        for name, counter, max_count, max_amount in self._counters(user_id):
+            count, total = counter.totals(seconds)
+            if count + 1 > max_count:
+                return f"{name} transfer count limit of {max_count} reached"
+            if total + amount > max_amount:
+                return f"{name} amount limit of {max_amount:.2f} reached"
+        return None
+
+    def record(self, user_id, amount, when=None):
+        seconds = self._seconds(when)
+        for _, counter, _, _ in self._counters(user_id):
+            counter.add(seconds, amount)
+
+    def rebuild(self, transactions, now=None):
+        """Refill counters from transactions, oldest first (e.g. the time index range for the last day)."""
+        self.counters = {}
+        cutoff = self._seconds(now) - self.max_window
+        for transaction in transactions:
+            seconds = transaction.timestamp // 1_000_000
+            if seconds > cutoff and not is_fee_leg(transaction):
+                self.record(transaction.sender_id, transaction.amount, transaction.timestamp)
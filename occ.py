@@ -0,0 +1,243 @@
+import os
+import random
+import sqlite3
+import time
+
+import openpyxl
+
+from archive import transaction_number
+
+
+class VersionConflict(Exception):
+    """A wallet changed between the read and the compare-and-swap write."""
+
+
+class VersionedWalletStore:
+    """Wallet balances with a version number per row, shared by several processes.
+
+    Readers take no lock. A write is a compare-and-swap: each wallet row is
+    updated only if its version is still the one that was read, and every
+    successful write bumps the version. All the wallet updates of one
+    transfer and its ledger rows commit in one short SQLite transaction, so
+    a transfer is either fully applied or not at all. Nothing is locked
+    while a writer reads and decides; SQLite only serialises the commits.
+    """
+
+    def __init__(self, filename="wallets.db"):
+        self.connection = sqlite3.connect(filename, timeout=30, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS wallets (user_id TEXT PRIMARY KEY, "
+                                "balance REAL NOT NULL, version INTEGER NOT NULL DEFAULT 0)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS transactions (transaction_id TEXT PRIMARY KEY, "
+                                "sender_id TEXT, receiver_id TEXT, amount REAL, date TEXT)")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)")
+        self.connection.execute("INSERT OR IGNORE INTO counters VALUES ('transaction', 0)")
+
+    def import_workbook(self, filename="users.xlsx", transactions_file=None):
+        """Copy balances, and optionally the ledger, from the workbooks; rows already in the store win."""
+        wb = openpyxl.load_workbook(filename, read_only=True)
+        rows = [(row[0], row[3] or 0.0) for row in wb.active.iter_rows(min_row=2, values_only=True)]
+        wb.close()
+        ledger = []
+        if transactions_file is not None:
+            wb = openpyxl.load_workbook(transactions_file, read_only=True)
+            ledger = [tuple(row[:5]) for row in wb.active.iter_rows(min_row=2, values_only=True)]
+            wb.close()
+        self.connection.execute("BEGIN")
+        self.connection.executemany("INSERT OR IGNORE INTO wallets (user_id, balance) VALUES (?, ?)", rows)
+        self.connection.executemany("INSERT OR IGNORE INTO transactions VALUES (?, ?, ?, ?, ?)", ledger)
+        if ledger:
+            last = max(transaction_number(row[0]) for row in ledger)
+            self.connection.execute("UPDATE counters SET value = MAX(value, ?) WHERE name = 'transaction'", (last,))
+        self.connection.execute("COMMIT")
+
+    def create(self, user_id, balance=0.0):
+        """Add a wallet for user_id unless one exists; an existing balance is kept."""
+        self.connection.execute("INSERT OR IGNORE INTO wallets (user_id, balance) VALUES (?, ?)",
+                                (user_id, balance or 0.0))
+
+    def read(self, user_id):
+        """Return (balance, version), or None for an unknown wallet."""
+        return self.connection.execute("SELECT balance, version FROM wallets WHERE user_id = ?",
+                                       (user_id,)).fetchone()
+
+    def overwrite(self, user_id, balance):
+        """Set a balance unconditionally, for recovery and administration."""
+        self.connection.execute("UPDATE wallets SET balance = ?, version = version + 1 WHERE user_id = ?",
+                                (balance, user_id))
+
+    def next_transaction_number(self):
+        """Claim the next transaction number; numbers are unique across every process using the store."""
+        return self.connection.execute("UPDATE counters SET value = value + 1 WHERE name = 'transaction' "
+                                       "RETURNING value").fetchone()[0]
+
+    def commit(self, changes, rows=()):
+        """Apply changes, a list of (user_id, version read, balance change), and insert the ledger rows.
+
+        Raises VersionConflict, leaving the store untouched, when any
+        version is stale.
+        """
+        cursor = self.connection.cursor()
+        cursor.execute("BEGIN")
+        try:
+            for user_id, version, change in changes:
+                cursor.execute("UPDATE wallets SET balance = balance + ?, version = version + 1 "
+                               "WHERE user_id = ? AND version = ?", (change, user_id, version))
+                if cursor.rowcount != 1:
+                    raise VersionConflict(user_id)
+            cursor.executemany("INSERT INTO transactions VALUES (?, ?, ?, ?, ?)", rows)
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        cursor.execute("COMMIT")
+
+    def transaction_rows(self):
+        return self.connection.execute("SELECT transaction_id, sender_id, receiver_id, amount, date "
+                                       "FROM transactions ORDER BY rowid")
+
+    def close(self):
+        self.connection.close()
+
+
+class VersionedWallet:
+    """Wallet whose balance lives in a VersionedWalletStore row and changes only by compare-and-swap."""
+
+    __slots__ = ("engine", "user_id")
+
+    def __init__(self, engine, user_id):
+        self.engine = engine
+        self.user_id = user_id
+
+    @property
+    def balance(self):
+        return self.engine.store.read(self.user_id)[0]
+
+    @balance.setter
+    def balance(self, amount):
+        self.engine.store.overwrite(self.user_id, amount)
+
+    def deposit(self, amount):
+        self.engine.apply({self.user_id: amount})
+
+    def withdraw(self, amount):
+        return self.engine.apply({self.user_id: -amount})
+
+    def check_balance(self):
+        return self.balance
+
+
+class OptimisticTransfers:
+    """Transfer logic that retries on version conflicts instead of holding a lock.
+
+    think_time is a pause between reading the wallets and the
+    compare-and-swap, standing in for the fee, limit and fraud checks a
+    real transfer makes in that window.
+    """
+
+    def __init__(self, store, max_retries=50, think_time=0.0):
+        self.store = store
+        self.max_retries = max_retries
+        self.think_time = think_time
+        self.commits = 0
+        self.aborts = 0
+
+    def wallet(self, user_id, initial_balance=0.0):
+        """Wallet for user_id, creating its row with initial_balance if the store has none."""
+        self.store.create(user_id, initial_balance)
+        return VersionedWallet(self, user_id)
+
+    def apply(self, changes, rows=()):
+        """Apply {user_id: balance change} and the ledger rows atomically.
+
+        Returns False, changing nothing, if a wallet is unknown or a debit
+        would overdraw it. Raises VersionConflict after max_retries
+        conflicting attempts.
+        """
+        for attempt in range(self.max_retries):
+            versions = []
+            for user_id, change in changes.items():
+                current = self.store.read(user_id)
+                if current is None or current[0] + change < -1e-9:
+                    return False
+                versions.append((user_id, current[1], change))
+            if self.think_time:
+                time.sleep(self.think_time)
+            try:
+                self.store.commit(versions, rows)
+            except VersionConflict:
+                self.aborts += 1
+                # Randomised backoff so colliding workers do not retry in lockstep.
+                time.sleep(random.uniform(0, 0.0005 * (attempt + 1)))
+                continue
+            self.commits += 1
+            return True
+        raise VersionConflict(", ".join(changes))
+
+    def transfer(self, sender_id, receiver_id, amount):
+        """Returns the transaction ID, or None for unknown users, low balance or too many conflicts."""
+        if sender_id == receiver_id or amount <= 0:
+            return None
+        transaction_id = f"T{self.store.next_transaction_number():03d}"
+        row = (transaction_id, sender_id, receiver_id, amount, time.strftime("%Y-%m-%d %H:%M:%S"))
+        try:
+            applied = self.apply({sender_id: -amount, receiver_id: amount}, [row])
+        except VersionConflict:
+            return None
+        return transaction_id if applied else None
+
+
+def _bench_worker(filename, accounts, transfers, think_time, seed, results):
+    random.seed(seed)
+    store = VersionedWalletStore(filename)
+    engine = OptimisticTransfers(store, think_time=think_time)
+    for _ in range(transfers):
+        sender, receiver = random.sample(accounts, 2)
+        engine.transfer(sender, receiver, 1.0)
+    results.put((engine.commits, engine.aborts))
+    store.close()
+
+
+def benchmark(processes=4, transfers=500, account_counts=(2, 10, 100, 10000), think_time=0.001):
+    """Throughput and abort rate for several worker processes at different contention levels.
+
+    Each worker pauses think_time between reading the wallets and the
+    compare-and-swap, so conflicts are as likely as they would be for a
+    transfer that does real work in between. An abort is an attempt that
+    found a wallet changed and had to re-read it.
+    """
+    import multiprocessing
+    import tempfile
+
+    for account_count in account_counts:
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "wallets.db")
+            store = VersionedWalletStore(filename)
+            accounts = [f"U{i:05d}" for i in range(account_count)]
+            store.connection.execute("BEGIN")
+            store.connection.executemany("INSERT INTO wallets (user_id, balance) VALUES (?, ?)",
+                                         [(user_id, 1e9) for user_id in accounts])
+            store.connection.execute("COMMIT")
+            results = multiprocessing.Queue()
+            workers = [multiprocessing.Process(target=_bench_worker,
+                                               args=(filename, accounts, transfers, think_time, seed, results))
+                       for seed in range(processes)]
+            started = time.perf_counter()
+            for worker in workers:
+                worker.start()
+            outcomes = [results.get() for _ in workers]
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - started
+            commits = sum(c for c, _ in outcomes)
+            aborts = sum(a for _, a in outcomes)
+            total = sum(store.read(user_id)[0] for user_id in accounts)
+            rows = store.connection.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+            store.close()
+            print(f"{account_count:>6} accounts: {commits / elapsed:8.0f} transfers/s, "
+                  f"abort rate {aborts / max(commits + aborts, 1):6.1%}, "
+                  f"money conserved: {abs(total - 1e9 * account_count) < 1e-6}, "
+                  f"ledger rows match: {rows == commits}")
+
+
+if __name__ == "__main__":
+    benchmark()
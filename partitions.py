@@ -0,0 +1,152 @@
+import json
+import os
+from datetime import datetime
+
+import openpyxl
+
+from export import TRANSACTION_HEADERS, export_rows
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Earliest possible date; a partition key padded with its tail is the partition's first instant.
+EARLIEST_DATE = "0001-01-01 00:00:00"
+# Number of leading characters of a "%Y-%m-%d %H:%M:%S" date that name its partition.
+PERIOD_KEY_LENGTHS = {"year": 4, "month": 7, "day": 10}
+
+
+def _date_text(date):
+    return date.strftime(DATE_FORMAT) if isinstance(date, datetime) else str(date)
+
+
+class PartitionedLedger:
+    """Transaction rows split into one workbook per period, plus a manifest.
+
+    Partitions are named by a date prefix ("2024-12" for monthly), so keys
+    sort in time order and a date range maps to a contiguous key range.
+    Queries only open the partitions inside that range, and appends only
+    open the partitions the new rows fall into. This also keeps every file
+    far below Excel's 1,048,576-row sheet limit.
+
+    With hot_partitions set, MobilePaymentSystem loads only that many of
+    the newest partitions at startup and reads older ones per query.
+    """
+
+    def __init__(self, directory="transactions", period="month", hot_partitions=None):
+        if period not in PERIOD_KEY_LENGTHS:
+            raise ValueError(f"Unknown partition period: {period}")
+        self.directory = directory
+        self.manifest_file = os.path.join(directory, "manifest.json")
+        os.makedirs(directory, exist_ok=True)
+        self.manifest = self._load_manifest(period)
+        self.period = self.manifest["period"]
+        self.partitions = self.manifest["partitions"]
+        self.hot_partitions = hot_partitions
+
+    def _load_manifest(self, period):
+        if os.path.exists(self.manifest_file):
+            with open(self.manifest_file, encoding="utf-8") as f:
+                return json.load(f)
+        return {"period": period, "partitions": {}}
+
+    def _save_manifest(self):
+        temp_file = self.manifest_file + ".tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(temp_file, self.manifest_file)
+
+    def partition_key(self, date):
+        return _date_text(date)[:PERIOD_KEY_LENGTHS[self.period]]
+
+    def key_start(self, key):
+        """First date (as text) that falls into partition key."""
+        return key + EARLIEST_DATE[len(key):]
+
+    def hot_start(self):
+        """First date of the hot partitions, or None when every partition is hot."""
+        keys = sorted(self.partitions)
+        if self.hot_partitions is None or len(keys) <= self.hot_partitions:
+            return None
+        return self.key_start(keys[-self.hot_partitions])
+
+    def _path(self, key):
+        return os.path.join(self.directory, self.partitions[key]["file"])
+
+    def append(self, rows):
+        """Add transaction rows, touching only the partitions they belong to."""
+        grouped = {}
+        for row in rows:
+            grouped.setdefault(self.partition_key(row[4]), []).append(list(row))
+        for key, new_rows in grouped.items():
+            info = self.partitions.get(key)
+            if info is None:
+                info = {"file": f"transactions-{key}.xlsx", "rows": 0}
+                self.partitions[key] = info
+                export_rows(new_rows, self._path(key), TRANSACTION_HEADERS, "xlsx")
+            else:
+                wb = openpyxl.load_workbook(self._path(key))
+                sheet = wb.active
+                for row in new_rows:
+                    sheet.append(row)
+                # Saved aside and renamed so a crash mid-save cannot corrupt the partition.
+                wb.save(self._path(key) + ".tmp")
+                os.replace(self._path(key) + ".tmp", self._path(key))
+            info["rows"] += len(new_rows)
+        if grouped:
+            self._save_manifest()
+
+    def keys_between(self, start=None, end=None):
+        """Partition keys overlapping [start, end], oldest first."""
+        low = self.partition_key(start) if start is not None else None
+        high = self.partition_key(end) if end is not None else None
+        return [key for key in sorted(self.partitions)
+                if (low is None or key >= low) and (high is None or key <= high)]
+
+    def _partition_rows(self, key):
+        wb = openpyxl.load_workbook(self._path(key), read_only=True)
+        try:
+            yield from wb.active.iter_rows(min_row=2, values_only=True)
+        finally:
+            wb.close()
+
+    def rows(self, start=None, end=None):
+        """Yield transaction rows dated within [start, end], in partition order."""
+        start_text = _date_text(start) if start is not None else None
+        end_text = _date_text(end) if end is not None else None
+        for key in self.keys_between(start, end):
+            for row in self._partition_rows(key):
+                date = _date_text(row[4])
+                if start_text is not None and date < start_text:
+                    continue
+                if end_text is not None and date > end_text:
+                    continue
+                yield row
+
+    def statement(self, user_id, start=None, end=None):
+        """Rows in the range where user_id is the sender or the receiver."""
+        return [row for row in self.rows(start, end) if user_id in (row[1], row[2])]
+
+    def drop(self, keys):
+        """Delete whole partitions, e.g. once they have been archived."""
+        for key in keys:
+            os.remove(self._path(key))
+            del self.partitions[key]
+        self._save_manifest()
+
+    def import_workbook(self, filename):
+        """Split an existing single-sheet transactions workbook into partitions."""
+        wb = openpyxl.load_workbook(filename, read_only=True)
+        try:
+            self.append(wb.active.iter_rows(min_row=2, values_only=True))
+        finally:
+            wb.close()
+
+    def __len__(self):
+        return sum(info["rows"] for info in self.partitions.values())
+
+
+if __name__ == "__main__":
+    import sys
+
+    source = sys.argv[1] if len(sys.argv) > 1 else "transactions.xlsx"
+    ledger = PartitionedLedger()
+    ledger.import_workbook(source)
+    print(f"Partitioned {len(ledger)} transactions into {len(ledger.partitions)} files.")
@@ -0,0 +1,23 @@
+import importlib.util
+import os
+import sys
+
+# Project(OOP).py holds MobilePaymentSystem, but its file name cannot be used
+# in a plain import statement, so the helper modules load it through here.
+CORE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Project(OOP).py")
+
+
+def load_core():
+    """Return the Project(OOP).py module, importing it once."""
+    module = sys.modules.get("project_oop")
+    if module is None:
+        spec = importlib.util.spec_from_file_location("project_oop", CORE_FILE)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["project_oop"] = module
+        spec.loader.exec_module(module)
+    return module
+
+
+def create_system(users_file="users.xlsx", transactions_file="transactions.xlsx"):
+    """Build a MobilePaymentSystem backed by the given workbooks."""
+    return load_core().MobilePaymentSystem(users_file, transactions_file)
@@ -0,0 +1,278 @@
+"""Scripted, profiled runs of the menu-driven CLI scripts.
+
+Usage:
+    python perf_harness.py <script.py> <commands.txt> [--profile] [--fresh] [--out DIR]
+
+commands.txt holds the keystrokes one per line, exactly as they would be
+typed at the input() prompts. Blank lines and lines starting with "#" are
+skipped. The script runs its normal __main__ code with input() fed from the
+file, so the same code paths are exercised on every run. --fresh runs it in
+a temporary copy of the current directory's .xlsx files, so every run starts
+from the same data.
+
+--profile writes to DIR (default profile_out):
+    profile.prof      cProfile stats (open with pstats or snakeviz)
+    stacks.collapsed  sampled stacks in flamegraph.pl / speedscope format
+    allocations.txt   top tracemalloc allocation sites per menu operation
+    output.log        everything the script printed
+
+Allocation tracking slows every allocation down and its per-operation
+snapshots are expensive, so it runs as a second pass over the same commands.
+That pass always runs in a copy of the workbooks as they were before the
+first pass, so the commands are never applied to the real files twice and
+both passes take the same code paths. The timing, profile and stack
+samples come from the first pass and see only the script's own work.
+"""
+import builtins
+import cProfile
+import glob
+import os
+import pstats
+import re
+import runpy
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+
+MENU_LINE = re.compile(r"^\s*(\d+)\. (.+)$")
+MENU_PROMPT = "Choose an option"
+
+
+class ScriptedInput:
+    """Replacement for input() that replays a command file and marks menu operations."""
+
+    def __init__(self, commands, output, on_operation=None):
+        self.commands = iter(commands)
+        self.output = output
+        self.on_operation = on_operation
+        self.menu = {}
+
+    def __call__(self, prompt=""):
+        self.output.write(prompt)
+        try:
+            value = next(self.commands)
+        except StopIteration:
+            raise EOFError("command file exhausted") from None
+        self.output.write(value + "\n")
+        if prompt.startswith(MENU_PROMPT) and self.on_operation:
+            self.on_operation(self.menu.get(value, f"option {value}"))
+        return value
+
+    def learn_menu(self, text):
+        for line in text.splitlines():
+            match = MENU_LINE.match(line)
+            if match:
+                self.menu[match.group(1)] = match.group(2).strip()
+
+
+class _MenuAwareOutput:
+    def __init__(self, stream, scripted_input):
+        self.stream = stream
+        self.scripted_input = scripted_input
+
+    def write(self, text):
+        self.scripted_input.learn_menu(text)
+        return self.stream.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+class StackSampler:
+    """Background thread that samples the main thread's stack into collapsed-stack counts."""
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, filename):
+        with open(filename, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{stack} {count}\n")
+
+
+class AllocationTracker:
+    """Attributes tracemalloc growth to the menu operation that was running."""
+
+    def __init__(self, top=10):
+        self.top = top
+        self.current = "startup"
+        self.sites = {}
+        self.runs = {}
+        self._snapshot = None
+
+    # Sites in these files are the tracker's own bookkeeping, not the script's.
+    IGNORED = (tracemalloc.__file__, __file__)
+
+    def start(self):
+        # Sites are grouped by their innermost frame, so one frame per trace is enough.
+        tracemalloc.start(1)
+        self._snapshot = tracemalloc.take_snapshot()
+
+    def switch(self, operation):
+        snapshot = tracemalloc.take_snapshot()
+        sites = self.sites.setdefault(self.current, {})
+        for stat in snapshot.compare_to(self._snapshot, "lineno"):
+            frame = stat.traceback[0]
+            if stat.size_diff > 0 and frame.filename not in self.IGNORED:
+                site = f"{frame.filename}:{frame.lineno}"
+                sites[site] = sites.get(site, 0) + stat.size_diff
+        self.runs[self.current] = self.runs.get(self.current, 0) + 1
+        self.current = operation
+        self._snapshot = snapshot
+
+    def stop(self):
+        self.switch("shutdown")
+        tracemalloc.stop()
+
+    def report(self):
+        lines = []
+        for operation, sites in self.sites.items():
+            total = sum(sites.values())
+            lines.append(f"== {operation} (ran {self.runs.get(operation, 0)}x, {total / 1024:.1f} KiB allocated)")
+            for site, size in sorted(sites.items(), key=lambda item: -item[1])[:self.top]:
+                lines.append(f"   {size / 1024:10.1f} KiB  {site}")
+        return "\n".join(lines)
+
+
+def read_commands(filename):
+    with open(filename, encoding="utf-8") as f:
+        return [line.rstrip("\r\n") for line in f
+                if line.strip() and not line.lstrip().startswith("#")]
+
+
+def _replay(script, commands, log_file, on_operation=None, before=None, after=None):
+    sys.path.insert(0, os.path.dirname(script))
+    with open(log_file, "w", encoding="utf-8") as log:
+        scripted_input = ScriptedInput(commands, log, on_operation)
+        original_input = builtins.input
+        builtins.input = scripted_input
+        try:
+            with redirect_stdout(_MenuAwareOutput(log, scripted_input)):
+                if before:
+                    before()
+                started = time.perf_counter()
+                try:
+                    runpy.run_path(script, run_name="__main__")
+                except EOFError:
+                    pass
+                elapsed = time.perf_counter() - started
+                if after:
+                    after()
+        finally:
+            builtins.input = original_input
+            sys.path.remove(os.path.dirname(script))
+    return elapsed
+
+
+def run_script(script, commands, profile=False, out_dir="profile_out"):
+    """Run script's __main__ with scripted input; returns elapsed seconds."""
+    script = os.path.abspath(script)
+    out_dir = os.path.abspath(out_dir)
+    os.makedirs(out_dir, exist_ok=True)
+    if not profile:
+        return _replay(script, commands, os.path.join(out_dir, "output.log"))
+
+    profiler = cProfile.Profile()
+    sampler = StackSampler(threading.get_ident())
+
+    def start():
+        sampler.start()
+        profiler.enable()
+
+    def stop():
+        profiler.disable()
+        sampler.stop()
+
+    elapsed = _replay(script, commands, os.path.join(out_dir, "output.log"), before=start, after=stop)
+    profiler.dump_stats(os.path.join(out_dir, "profile.prof"))
+    sampler.write(os.path.join(out_dir, "stacks.collapsed"))
+    pstats.Stats(profiler).sort_stats("cumulative").print_stats(20)
+    return elapsed
+
+
+def track_allocations(script, commands, out_dir="profile_out"):
+    """Replay the commands again under tracemalloc and write allocations.txt."""
+    script = os.path.abspath(script)
+    out_dir = os.path.abspath(out_dir)
+    tracker = AllocationTracker()
+    _replay(script, commands, os.devnull, tracker.switch, tracker.start, tracker.stop)
+    with open(os.path.join(out_dir, "allocations.txt"), "w", encoding="utf-8") as f:
+        f.write(tracker.report() + "\n")
+    print(tracker.report())
+
+
+def _copy_workbooks(source, target):
+    for workbook in glob.glob(os.path.join(source, "*.xlsx")):
+        shutil.copy(workbook, target)
+
+
+def _in_copy(function, *args, source="."):
+    """Call function from a temporary copy of the workbooks in source (default: the current directory)."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        _copy_workbooks(source, work_dir)
+        previous = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            return function(*args)
+        finally:
+            os.chdir(previous)
+
+
+def main(argv):
+    args = [arg for arg in argv if not arg.startswith("--")]
+    out_dir = "profile_out"
+    if "--out" in argv:
+        out_dir = argv[argv.index("--out") + 1]
+        args.remove(out_dir)
+    if len(args) != 2:
+        print(__doc__)
+        return 1
+    script, command_file = args
+    commands = read_commands(command_file)
+    out_dir = os.path.abspath(out_dir)
+    script = os.path.abspath(script)
+    profile = "--profile" in argv
+    if "--fresh" in argv:
+        elapsed = _in_copy(run_script, script, commands, profile, out_dir)
+        if profile:
+            _in_copy(track_allocations, script, commands, out_dir)
+    else:
+        with tempfile.TemporaryDirectory() as before:
+            if profile:
+                _copy_workbooks(".", before)
+            elapsed = run_script(script, commands, profile, out_dir)
+            if profile:
+                _in_copy(track_allocations, script, commands, out_dir, source=before)
+    print(f"Ran {len(commands)} scripted inputs through {script} in {elapsed:.3f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -2,6 +2,10 @@ import openpyxl
 from datetime import datetime
 import os
 
+from cdc import EventFeed, transfer_id
+from statements import StatementStore
+from time_index import to_epoch_us
+
 # --- Classes ---
 
 class Wallet:
@@ -107,6 +111,8 @@ def save_transactions(transactions, filename="transactions.xlsx"):
 def main():
     users = load_users()
     transactions = []
+    feed = EventFeed()
+    statements = StatementStore()
 
     while True:
         print("\nWelcome to the Mobile Payment System!")
@@ -152,6 +158,15 @@ def main():
                     transactions.append(transaction)
                     save_users(users)  # Save updated balances
                     save_transactions(transactions)  # Save the transaction
+                    timestamp = to_epoch_us(transaction.date)
+                    statements.record(sender_id, timestamp, transaction_id, -amount, sender.wallet.check_balance())
+                    statements.record(receiver_id, timestamp, transaction_id, amount, receiver.wallet.check_balance())
+                    statements.flush()
+                    # transaction.date only has whole seconds, so the event ID takes a finer clock.
+                    event_id = transfer_id(sender_id, to_epoch_us(datetime.now()))
+                    feed.publish("transfer", event_id, transaction_id=transaction_id, sender=sender_id,
+                                 receiver=receiver_id, amount=amount, fee=0.0,
+                                 timestamp=timestamp)
                     print(f"Transaction successful! {amount:.2f} sent to {receiver.name}.")
                 else:
                     print("Insufficient balance. Transaction failed.")
@@ -164,6 +179,10 @@ def main():
             if user_id in users:
                 users[user_id].receive_money(amount)
                 save_users(users)  # Save updated balance
+                timestamp = to_epoch_us(datetime.now())
+                statements.record(user_id, timestamp, None, amount, users[user_id].wallet.check_balance())
+                statements.flush()
+                feed.publish_deposit(user_id, amount, timestamp)
                 print(f"Money received! ${amount:.2f} added to wallet.")
             else:
                 print("User not found.")
@@ -176,6 +195,7 @@ def main():
         elif choice == "6":
             save_users(users)
             save_transactions(transactions)
+            statements.close()
             print("Exiting... Goodbye!")
             break
 
@@ -0,0 +1,284 @@
+import json
+import os
+import uuid
+
+from archive import transaction_number
+from export import transaction_rows
+from fees import FEE_ACCOUNT_ID
+
+REPLAY_BATCH = 10000
+
+
+class Journal:
+    """Append-only write-ahead log of transfers and registrations.
+
+    MobilePaymentSystem writes each entry here before it changes a balance.
+    A crash at any later point can therefore be repaired by replaying the
+    entries recorded after the last snapshot. Entries are JSON lines, so
+    file order is also transaction ID order.
+
+    A checkpoint logs a mark before it writes its snapshot and truncates the
+    journal after. If it crashes in between, the entries up to the mark
+    named in the snapshot are already part of it and are not replayed.
+    """
+
+    def __init__(self, filename="journal.log", sync=True):
+        self.filename = filename
+        self.sync = sync
+        self._file = open(filename, "a", encoding="utf-8")
+
+    def _write(self, entry):
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        if self.sync:
+            os.fsync(self._file.fileno())
+
+    def log_transfer(self, transaction, fee=0.0, fee_id=None):
+        self._write({"type": "transfer", "id": transaction.transaction_id,
+                     "sender": transaction.sender_id, "receiver": transaction.receiver_id,
+                     "amount": transaction.amount, "fee": fee, "fee_id": fee_id,
+                     "timestamp": transaction.timestamp})
+
+    def log_deposit(self, user_id, amount, deposit_id=None, timestamp=None):
+        self._write({"type": "deposit", "user_id": user_id, "amount": amount, "id": deposit_id,
+                     "timestamp": timestamp})
+
+    def log_user(self, user):
+        self._write({"type": "register", "user_id": user.user_id, "name": user.name,
+                     "phone": user.phone_number, "balance": user.wallet.check_balance()})
+
+    def log_checkpoint(self, mark):
+        self._write({"type": "checkpoint", "mark": mark})
+        self.fsync()
+
+    def fsync(self):
+        """Force every entry written so far to disk, for journals opened with sync=False."""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def entries(self, after_mark=None):
+        """Journalled entries, starting after the checkpoint mark after_mark if the journal holds it."""
+        if not os.path.exists(self.filename):
+            return
+        skip = 0
+        if after_mark is not None:
+            with open(self.filename, encoding="utf-8") as f:
+                for number, line in enumerate(f, 1):
+                    if after_mark in line and json.loads(line).get("mark") == after_mark:
+                        skip = number
+                        break
+        with open(self.filename, encoding="utf-8") as f:
+            for _ in range(skip):
+                next(f)
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        break  # a torn final line from a crash mid-write was never acted on
+
+    def truncate(self):
+        self._file.close()
+        self._file = open(self.filename, "w", encoding="utf-8")
+
+    def close(self):
+        self._file.close()
+
+
+def write_snapshot(system, filename="snapshot.json", journal_mark=None):
+    """Save every balance plus the last transaction number they include, atomically.
+
+    With an event feed, its current end is saved too: events for journal
+    entries after this snapshot can only have been published past it.
+    journal_mark is the checkpoint mark logged just before this snapshot.
+    """
+    snapshot = {"last_transaction_number": system._last_transaction_number,
+                "journal_mark": journal_mark,
+                "users": [[u.user_id, u.name, u.phone_number, u.wallet.check_balance()]
+                          for u in system.users.values()]}
+    if system.event_feed is not None:
+        snapshot["feed_position"] = system.event_feed.position()
+    with open(filename + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(filename + ".tmp", filename)
+
+
+def read_snapshot(filename="snapshot.json"):
+    with open(filename, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def checkpoint(system, snapshot_file="snapshot.json"):
+    """Persist a consistent state and start a fresh journal tail after it."""
+    system.save_users()
+    system.save_transactions()
+    mark = None
+    if system.journal is not None:
+        mark = uuid.uuid4().hex
+        system.journal.log_checkpoint(mark)
+    write_snapshot(system, snapshot_file, mark)
+    if system.journal is not None:
+        system.journal.truncate()
+
+
+def recover(system, snapshot_file="snapshot.json", batch_size=REPLAY_BATCH):
+    """Rebuild balances from the last snapshot plus the journal tail.
+
+    The system's users are reset to the snapshot and every journal entry
+    newer than it is applied in order. Wallets come from the system's own
+    _new_wallet, so a balance table keeps receiving the recovered balances.
+    Entries are applied in batches straight to the wallets, with no
+    per-entry balance checks or saves: each was validated before it was
+    logged. Transactions already in storage are kept. Journalled ones
+    missing from it are added, and a partitioned ledger gets only those
+    appended. Replayed transfers and deposits that never reached the event
+    feed are published to it, and those missing from the statement store are
+    recorded there. The repaired state is saved once, a new
+    checkpoint is taken, and the search index, limiter and analytics are
+    rebuilt. Returns the number of journal entries replayed.
+    """
+    from payment_core import load_core
+
+    if not os.path.exists(snapshot_file):
+        raise FileNotFoundError(f"No snapshot to recover from: {snapshot_file}")
+    core = load_core()
+    snapshot = read_snapshot(snapshot_file)
+    last_number = snapshot["last_transaction_number"]
+    if system.user_repository is None:
+        system.users = {}
+    users = system.users
+    for user_id, name, phone, balance in snapshot["users"]:
+        wallet = system._new_wallet(user_id, balance)
+        # A balance table slot keeps the balance from before the crash; the snapshot wins.
+        wallet.balance = balance
+        users[user_id] = core.User(user_id, name, phone, wallet)
+    # Transactions loaded from storage resolve their users through the discarded dict.
+    for transaction in system.transactions:
+        transaction.users = users
+
+    known = {t.transaction_id for t in system.transactions}
+    stored = set(known)
+    # Transfers up to here were moved to the archive; replay their balances but not their rows.
+    archived_through = system.archive.last_number if system.archive is not None else 0
+    replayed = []
+    batch = []
+    recorded = {}
+    # Entries up to the snapshot's own mark are already in it (a crash before the truncate).
+    entries = system.journal.entries(snapshot.get("journal_mark")) if system.journal is not None else iter(())
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            replayed += _apply_batch(system, core, batch, last_number, known, archived_through, recorded)
+            batch = []
+    replayed += _apply_batch(system, core, batch, last_number, known, archived_through, recorded)
+    if system.event_feed is not None:
+        _publish_replayed(system, replayed, snapshot.get("feed_position", 0))
+
+    system.transactions.sort(key=lambda t: transaction_number(t.transaction_id))
+    transactions = system.transactions
+    system.transactions = []
+    system.time_index = type(system.time_index)()
+    for transaction in transactions:
+        system._record(transaction)
+    system._last_transaction_number = max([last_number] + [transaction_number(t.transaction_id)
+                                                           for t in transactions])
+    if system.ledger is not None:
+        # Partitions are append-only; add just the journalled transactions they never received.
+        system.ledger.append(transaction_rows([t for t in transactions if t.transaction_id not in stored]))
+    system._saved_transactions = len(transactions)
+    checkpoint(system, snapshot_file)
+    system.rebuild_indexes()
+    return len(replayed)
+
+
+def _publish_replayed(system, replayed, feed_position):
+    # Entries may have been published before the crash; their events sit after feed_position.
+    published = system.event_feed.event_ids(feed_position)
+    for entry in replayed:
+        if entry["type"] == "transfer" and entry["id"] not in published:
+            system.event_feed.publish("transfer", entry["id"], transaction_id=entry["id"],
+                                      sender=entry["sender"], receiver=entry["receiver"],
+                                      amount=entry["amount"], fee=entry["fee"], timestamp=entry["timestamp"])
+        elif entry["type"] == "deposit" and entry.get("id") not in published:
+            system.event_feed.publish_deposit(entry["user_id"], entry["amount"], entry.get("timestamp"),
+                                              entry.get("id"))
+
+
+def _record_statement(system, recorded, user_id, timestamp, transaction_id, amount, balance_after):
+    # Movements flushed to the statement files before the crash must not be recorded twice.
+    keys = recorded.get(user_id)
+    if keys is None:
+        keys = recorded[user_id] = system.statements.recorded(user_id, timestamp)
+    if (timestamp, transaction_number(transaction_id) if transaction_id else 0) not in keys:
+        system.statements.record(user_id, timestamp, transaction_id, amount, balance_after)
+
+
+def _apply_batch(system, core, batch, last_number, known, archived_through=0, recorded=None):
+    users = system.users
+    statements = system.statements is not None and recorded is not None
+    applied = []
+    for entry in batch:
+        if entry["type"] == "checkpoint":
+            continue
+        if entry["type"] == "register":
+            if entry["user_id"] not in users:
+                wallet = system._new_wallet(entry["user_id"], entry["balance"])
+                wallet.balance = entry["balance"]
+                users[entry["user_id"]] = core.User(entry["user_id"], entry["name"], entry["phone"], wallet)
+                applied.append(entry)
+            continue
+        if entry["type"] == "deposit":
+            user = users[entry["user_id"]]
+            user.receive_money(entry["amount"])
+            if statements and entry.get("timestamp") is not None:
+                _record_statement(system, recorded, user.user_id, entry["timestamp"], None, entry["amount"],
+                                  user.wallet.check_balance())
+            applied.append(entry)
+            continue
+        if transaction_number(entry["id"]) <= last_number:
+            continue
+        with system._pinned((entry["sender"], entry["receiver"], FEE_ACCOUNT_ID)):
+            _apply_transfer(system, core, entry, known, archived_through, statements, recorded)
+        applied.append(entry)
+    return applied
+
+
+def _apply_transfer(system, core, entry, known, archived_through, statements, recorded):
+    users = system.users
+    sender = users[entry["sender"]]
+    receiver = users[entry["receiver"]]
+    sender.wallet.balance -= entry["amount"] + entry["fee"]
+    receiver.wallet.deposit(entry["amount"])
+    if entry["id"] not in known and transaction_number(entry["id"]) > archived_through:
+        system.transactions.append(core.Transaction(entry["id"], entry["sender"], entry["receiver"],
+                                                    entry["amount"], entry["timestamp"], users))
+        known.add(entry["id"])
+    if entry["fee"]:
+        fee_account = system._fee_account()
+        fee_account.receive_money(entry["fee"])
+        if entry["fee_id"] not in known and transaction_number(entry["fee_id"]) > archived_through:
+            system.transactions.append(core.Transaction(entry["fee_id"], entry["sender"], fee_account.user_id,
+                                                        entry["fee"], entry["timestamp"], users))
+            known.add(entry["fee_id"])
+    if statements:
+        timestamp, fee = entry["timestamp"], entry["fee"]
+        sender_balance = sender.wallet.check_balance()
+        _record_statement(system, recorded, sender.user_id, timestamp, entry["id"], -entry["amount"],
+                          sender_balance + fee)
+        _record_statement(system, recorded, receiver.user_id, timestamp, entry["id"], entry["amount"],
+                          receiver.wallet.check_balance())
+        if fee:
+            _record_statement(system, recorded, sender.user_id, timestamp, entry["fee_id"], -fee, sender_balance)
+            _record_statement(system, recorded, fee_account.user_id, timestamp, entry["fee_id"], fee,
+                              fee_account.wallet.check_balance())
+
+
+if __name__ == "__main__":
+    from payment_core import create_system
+
+    system = create_system()
+    system.journal = Journal()
+    print(f"Replayed {recover(system)} journal entries.")
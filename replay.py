@@ -0,0 +1,163 @@
+"""Replay recorded transactions.xlsx traffic against a fresh MobilePaymentSystem.
+
+Usage:
+    python replay.py [transactions.xlsx] [users.xlsx] [--speed N|max] [--max-gap SECONDS] [--opening FILE]
+
+The trace's Date column gives the arrival process. Each transfer is issued
+at its recorded offset from the first one divided by --speed (default 1,
+real time), or back to back with --speed max. --max-gap caps idle periods
+in the recording, so a trace spanning weeks can still be replayed at 1x.
+
+Latency is measured open-loop from each transfer's intended arrival time,
+so a replay that falls behind shows the queueing delay instead of hiding
+it. The fresh system starts from --opening balances if given, otherwise
+from users.xlsx balances with the trace's net flows backed out. Final
+balances are then compared with users.xlsx, the recorded run's end state.
+"""
+import os
+import sys
+import tempfile
+import time
+
+from export import workbook_rows
+from metrics import Histogram
+from payment_core import load_core
+from time_index import to_epoch_us
+
+
+def load_trace(filename="transactions.xlsx"):
+    """Return (transaction_id, sender_id, receiver_id, amount, timestamp_us) rows in arrival order."""
+    trace = [(str(transaction_id), str(sender_id), str(receiver_id), float(amount), to_epoch_us(date))
+             for transaction_id, sender_id, receiver_id, amount, date in workbook_rows(filename)
+             if transaction_id is not None]
+    trace.sort(key=lambda row: row[4])
+    return trace
+
+
+def arrival_offsets(trace, speed=1.0, max_gap=None):
+    """Seconds from the start of the replay at which each trace row should be issued."""
+    offsets = []
+    elapsed = 0.0
+    previous = trace[0][4] if trace else 0
+    for row in trace:
+        gap = (row[4] - previous) / 1_000_000
+        if max_gap is not None:
+            gap = min(gap, max_gap)
+        elapsed += gap
+        previous = row[4]
+        offsets.append(elapsed / speed)
+    return offsets
+
+
+def load_users(filename):
+    """Map user ID to (name, phone, balance) from a users workbook."""
+    return {str(user_id): (name, phone, float(balance or 0.0))
+            for user_id, name, phone, balance in workbook_rows(filename) if user_id is not None}
+
+
+def opening_balances(final, trace):
+    """Back the trace's net flows out of the final balances."""
+    opening = {user_id: balance for user_id, (_, _, balance) in final.items()}
+    for _, sender_id, receiver_id, amount, _ in trace:
+        opening[sender_id] = opening.get(sender_id, 0.0) + amount
+        opening[receiver_id] = opening.get(receiver_id, 0.0) - amount
+    return opening
+
+
+class ReplayReport:
+    def __init__(self, issued, failed, elapsed, latency, service, mismatches, missing_users):
+        self.issued = issued
+        self.failed = failed
+        self.elapsed = elapsed
+        self.latency = latency
+        self.service = service
+        self.mismatches = mismatches
+        self.missing_users = missing_users
+
+    def __str__(self):
+        lines = [f"Replayed {self.issued} transfers in {self.elapsed:.3f}s "
+                 f"({self.issued / self.elapsed if self.elapsed else 0:.0f}/s), {self.failed} failed"]
+        for label, histogram in (("latency", self.latency), ("service", self.service)):
+            quantiles = ", ".join(f"p{fraction * 100:g}={histogram.quantile(fraction) * 1000:.3f}ms"
+                                  for fraction in (0.5, 0.9, 0.99, 0.999))
+            lines.append(f"  {label}: {quantiles}, max={histogram.max * 1000:.3f}ms")
+        if self.missing_users:
+            lines.append(f"  {self.missing_users} users in the trace were not in users.xlsx")
+        if self.mismatches:
+            lines.append(f"  Final balances differ for {len(self.mismatches)} users:")
+            for user_id, expected, actual in self.mismatches[:20]:
+                lines.append(f"    {user_id}: recorded {expected:.2f}, replayed {actual:.2f}")
+        else:
+            lines.append("  Final balances match the recorded run.")
+        return "\n".join(lines)
+
+
+def replay(trace, final, opening, speed=1.0, max_gap=None):
+    """Drive a fresh system with the trace and return a ReplayReport. speed=None replays flat out."""
+    core = load_core()
+    with tempfile.TemporaryDirectory() as directory:
+        system = core.MobilePaymentSystem(os.path.join(directory, "users.xlsx"),
+                                          os.path.join(directory, "transactions.xlsx"))
+        missing_users = 0
+        for user_id, balance in opening.items():
+            if user_id not in final:
+                missing_users += 1
+            name, phone, _ = final.get(user_id, ("", "", 0.0))
+            system.users[user_id] = core.User(user_id, name, phone, system._new_wallet(user_id, balance))
+        offsets = arrival_offsets(trace, speed or 1.0, max_gap)
+        latency = Histogram("replay_latency_seconds")
+        service = Histogram("replay_service_seconds")
+        failed = 0
+        started = time.perf_counter()
+        for (_, sender_id, receiver_id, amount, _), offset in zip(trace, offsets):
+            intended = started + offset if speed else time.perf_counter()
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            issued = time.perf_counter()
+            if system.transfer(sender_id, receiver_id, amount, persist=False) is None:
+                failed += 1
+            done = time.perf_counter()
+            service.observe(done - issued)
+            latency.observe(done - min(intended, issued))
+        elapsed = time.perf_counter() - started
+        mismatches = []
+        for user_id, (_, _, expected) in final.items():
+            user = system.users.get(user_id)
+            actual = user.wallet.check_balance() if user else 0.0
+            if abs(actual - expected) > 1e-6:
+                mismatches.append((user_id, expected, actual))
+    return ReplayReport(len(trace), failed, elapsed, latency, service, mismatches, missing_users)
+
+
+def main(argv):
+    args = [arg for arg in argv if not arg.startswith("--")]
+    speed, max_gap, opening_file = 1.0, None, None
+    for flag in ("--speed", "--max-gap", "--opening"):
+        if flag in argv:
+            value = argv[argv.index(flag) + 1]
+            args.remove(value)
+            if flag == "--speed":
+                speed = None if value == "max" else float(value)
+            elif flag == "--max-gap":
+                max_gap = float(value)
+            else:
+                opening_file = value
+    if len(args) > 2:
+        print(__doc__)
+        return 1
+    transactions_file = args[0] if args else "transactions.xlsx"
+    users_file = args[1] if len(args) > 1 else "users.xlsx"
+    trace = load_trace(transactions_file)
+    final = load_users(users_file)
+    if opening_file:
+        opening = {user_id: balance for user_id, (_, _, balance) in load_users(opening_file).items()}
+    else:
+        opening = opening_balances(final, trace)
+    report = replay(trace, final, opening, speed, max_gap)
+    print(report)
+    return 1 if report.failed or report.mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
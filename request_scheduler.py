@@ -0,0 +1,210 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import nullcontext
+
+from admission import Overloaded
+
+# name: (weight, max requests of this class running at once)
+PRIORITY_CLASSES = {
+    "interactive": (8, 4),
+    "batch": (2, 2),
+    "maintenance": (1, 1),
+}
+LATENCY_SAMPLES = 10000
+# p99 latency (seconds) interactive requests should stay under, even with batch work running.
+INTERACTIVE_P99_SLO = 0.050
+
+
+class _PriorityClass:
+    def __init__(self, name, weight, limit):
+        self.name = name
+        self.weight = weight
+        self.limit = limit
+        self.queue = deque()
+        self.last_finish = 0.0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def percentile(self, fraction):
+        samples = sorted(self.latencies)
+        if not samples:
+            return 0.0
+        return samples[min(int(fraction * len(samples)), len(samples) - 1)]
+
+
+class RequestScheduler:
+    """Runs core operations from many clients with priority classes.
+
+    Requests are ordered by weighted fair queuing. Each request gets a
+    virtual finish tag 1/weight after its class's previous one, and workers
+    always take the smallest tag among classes that are under their
+    concurrency limit. With the default weights, interactive traffic gets
+    8 of every 11 dispatches while both queues are busy. Because batch and
+    maintenance can never fill every worker, a free worker is always left
+    for check_balance or send_money.
+
+    MobilePaymentSystem is not thread-safe, so each call runs under
+    core_lock. Bulk jobs should therefore be submitted as many small
+    requests, for example one per transfer, rather than one long call.
+    Reads that are safe next to a writer (a wallet balance, a snapshot
+    query) go through submit_read() and skip core_lock, so they are not
+    held up by a write that is already running.
+
+    With an admission.AdmissionController, submit() first asks it to admit
+    the request and raises Overloaded when its AIMD limit on outstanding
+    requests is reached. Each request's queue-plus-service latency is fed
+    back on completion, so the limit tracks what the core can serve within
+    the target latency.
+    """
+
+    def __init__(self, classes=None, workers=None, core_lock=None, max_queue=None, admission=None):
+        classes = classes or PRIORITY_CLASSES
+        self.classes = {name: _PriorityClass(name, weight, limit)
+                        for name, (weight, limit) in classes.items()}
+        self.workers = workers or sum(limit for _, limit in classes.values())
+        self.core_lock = core_lock or threading.Lock()
+        # Per-class queue bound; submit raises admission.Overloaded beyond it.
+        self.max_queue = max_queue
+        # Optional admission.AdmissionController in front of dispatch.
+        self.admission = admission
+        self._condition = threading.Condition()
+        self._virtual_time = 0.0
+        self._running = True
+        self._threads = [threading.Thread(target=self._work, daemon=True) for _ in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, priority, function, *args, **kwargs):
+        """Queue function(*args, **kwargs) in a priority class and return a Future."""
+        return self._submit(priority, True, function, args, kwargs)
+
+    def submit_read(self, priority, function, *args, **kwargs):
+        """Like submit(), but the call runs without core_lock; only for reads that tolerate a concurrent write."""
+        return self._submit(priority, False, function, args, kwargs)
+
+    def _submit(self, priority, locked, function, args, kwargs):
+        future = Future()
+        cls = self.classes[priority]
+        if self.admission is not None:
+            try:
+                self.admission.try_acquire()
+            except Overloaded:
+                with self._condition:
+                    cls.rejected += 1
+                raise
+        try:
+            self._enqueue(cls, future, locked, function, args, kwargs)
+        except BaseException:
+            if self.admission is not None:
+                self.admission.release(0.0)
+            raise
+        return future
+
+    def _enqueue(self, cls, future, locked, function, args, kwargs):
+        with self._condition:
+            if not self._running:
+                raise RuntimeError("Scheduler has been shut down.")
+            if self.max_queue is not None and len(cls.queue) >= self.max_queue:
+                cls.rejected += 1
+                latency = cls.percentile(0.50) or 0.001
+                raise Overloaded(len(cls.queue) * latency / cls.limit)
+            finish = max(self._virtual_time, cls.last_finish) + 1.0 / cls.weight
+            cls.last_finish = finish
+            cls.queue.append((finish, time.perf_counter(), future, locked, function, args, kwargs))
+            self._condition.notify()
+
+    def _next_request(self):
+        best = None
+        for cls in self.classes.values():
+            if cls.queue and cls.in_flight < cls.limit:
+                if best is None or cls.queue[0][0] < best.queue[0][0]:
+                    best = cls
+        return best
+
+    def _work(self):
+        while True:
+            with self._condition:
+                cls = self._next_request()
+                while cls is None:
+                    if not self._running:
+                        return
+                    self._condition.wait()
+                    cls = self._next_request()
+                finish, queued_at, future, locked, function, args, kwargs = cls.queue.popleft()
+                self._virtual_time = max(self._virtual_time, finish - 1.0 / cls.weight)
+                cls.in_flight += 1
+            if future.set_running_or_notify_cancel():
+                try:
+                    with self.core_lock if locked else nullcontext():
+                        result = function(*args, **kwargs)
+                except BaseException as error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+            latency = time.perf_counter() - queued_at
+            if self.admission is not None:
+                self.admission.release(latency)
+            with self._condition:
+                cls.in_flight -= 1
+                cls.completed += 1
+                cls.latencies.append(latency)
+                self._condition.notify_all()
+
+    def metrics(self):
+        """Queue depth, in-flight count and latency percentiles (seconds) per class."""
+        with self._condition:
+            return {name: {"queued": len(cls.queue), "in_flight": cls.in_flight,
+                           "completed": cls.completed, "rejected": cls.rejected, "p50": cls.percentile(0.50),
+                           "p99": cls.percentile(0.99)}
+                    for name, cls in self.classes.items()}
+
+    def meets_slo(self, priority="interactive", p99_target=INTERACTIVE_P99_SLO):
+        """True if the class's observed p99 latency is within p99_target seconds."""
+        return self.metrics()[priority]["p99"] <= p99_target
+
+    def metrics_text(self):
+        lines = []
+        for name, values in self.metrics().items():
+            lines.append(f"{name}: queued={values['queued']} in_flight={values['in_flight']} "
+                         f"completed={values['completed']} rejected={values['rejected']} p50={values['p50'] * 1000:.2f}ms "
+                         f"p99={values['p99'] * 1000:.2f}ms")
+        if self.admission is not None:
+            values = self.admission.metrics()
+            lines.append(f"admission: limit={values['limit']:.1f} in_flight={values['in_flight']} "
+                         f"admitted={values['admitted']} rejected={values['rejected']}")
+        return "\n".join(lines)
+
+    def shutdown(self, wait=True):
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+
+if __name__ == "__main__":
+    from payment_core import create_system
+
+    system = create_system()
+    scheduler = RequestScheduler()
+    user_ids = list(system.users)
+    # A bulk settlement of small transfers, plus one long save, competing with interactive balance checks.
+    batch = [scheduler.submit("batch", system.transfer, user_ids[0], user_ids[-1], 0.01, persist=False)
+             for _ in range(20000)]
+    batch.append(scheduler.submit("batch", system.save_transactions))
+    interactive = []
+    for _ in range(200):
+        interactive.append(scheduler.submit_read("interactive", system.users[user_ids[0]].wallet.check_balance))
+        time.sleep(0.001)
+    for future in interactive + batch:
+        future.result()
+    print(scheduler.metrics_text())
+    p99 = scheduler.metrics()["interactive"]["p99"]
+    print(f"interactive p99 {p99 * 1000:.2f}ms under batch load, SLO {INTERACTIVE_P99_SLO * 1000:.0f}ms: "
+          f"{'met' if scheduler.meets_slo() else 'MISSED'}")
+    scheduler.shutdown()
@@ -0,0 +1,180 @@
+import heapq
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+NON_DIGITS = re.compile(r"\D")
+PHONE_PUNCTUATION = re.compile(r"[\s+()-]")
+
+
+def normalize_name(name):
+    return " ".join(str(name or "").casefold().split())
+
+
+def normalize_phone(phone):
+    digits = NON_DIGITS.sub("", str(phone or ""))
+    # +880 1711... and 01711... are the same Bangladeshi number.
+    return "0" + digits[3:] if digits.startswith("880") else digits
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SortedKeys:
+    """Sorted (key, user number) pairs for prefix lookups, with a small unsorted-insert buffer.
+
+    New keys go into a delta list kept sorted by insort, so an insert shifts
+    at most MERGE_AT entries, not the whole index. The delta is merged into
+    the main list when it fills, which Timsort does in linear time because
+    both parts are already sorted.
+    """
+
+    MERGE_AT = 65536
+
+    def __init__(self):
+        self.keys = []
+        self.delta = []
+
+    def build(self, pairs):
+        self.keys = sorted(pairs)
+        self.delta = []
+
+    def add(self, key, number):
+        entry = (key, number)
+        self.delta.insert(bisect_left(self.delta, entry), entry)
+        if len(self.delta) >= self.MERGE_AT:
+            self.keys += self.delta
+            self.keys.sort()
+            self.delta = []
+
+    def prefix(self, prefix, limit):
+        """Up to limit (key, number) pairs whose key starts with prefix, in key order from each part."""
+        found = []
+        for keys in (self.keys, self.delta):
+            for i in range(bisect_left(keys, (prefix,)), len(keys)):
+                if not keys[i][0].startswith(prefix) or len(found) >= 2 * limit:
+                    break
+                found.append(keys[i])
+        found.sort()
+        return found
+
+
+class SearchIndex:
+    """Prefix and fuzzy lookup of users by name and phone number.
+
+    Names are indexed under the full normalised name and under each word,
+    so "rah" finds "Abdur Rahim". Phones are indexed by digits forwards and
+    reversed, so a query matches either the start or the end of a number.
+    Prefix queries are a binary search into SortedKeys. Fuzzy queries count
+    shared trigrams over posting lists, starting with the rarest trigrams
+    and stopping after SCAN_LIMIT postings, then rank the best candidates by
+    trigram Jaccard similarity. Users are stored by number, with postings in
+    compact arrays.
+    """
+
+    SCAN_LIMIT = 200000
+
+    def __init__(self):
+        self.user_ids = []
+        self.names = []
+        self.phones = []
+        self.name_keys = SortedKeys()
+        self.phone_keys = SortedKeys()
+        self.postings = {}
+
+    def _register(self, user_id, name, phone):
+        number = len(self.user_ids)
+        self.user_ids.append(user_id)
+        self.names.append(normalize_name(name))
+        self.phones.append(normalize_phone(phone))
+        for gram in trigrams(self.names[number]):
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array("I")
+            posting.append(number)
+        return number
+
+    def _name_keys(self, number):
+        name = self.names[number]
+        words = name.split()
+        keys = {name} | set(words[1:])
+        return [(key, number) for key in keys]
+
+    def _phone_keys(self, number):
+        phone = self.phones[number]
+        if not phone:
+            return []
+        return [(phone, number), ("~" + phone[::-1], number)]
+
+    def build(self, users):
+        """Index every (user_id, name, phone) in users, replacing the current contents."""
+        self.__init__()
+        name_keys = []
+        phone_keys = []
+        for user_id, name, phone in users:
+            number = self._register(user_id, name, phone)
+            name_keys += self._name_keys(number)
+            phone_keys += self._phone_keys(number)
+        self.name_keys.build(name_keys)
+        self.phone_keys.build(phone_keys)
+
+    def add(self, user_id, name, phone):
+        number = self._register(user_id, name, phone)
+        for key, _ in self._name_keys(number):
+            self.name_keys.add(key, number)
+        for key, _ in self._phone_keys(number):
+            self.phone_keys.add(key, number)
+
+    def prefix(self, query, limit=10):
+        """User IDs whose name word or phone starts with query (or phone ends with it), best first."""
+        digits = normalize_phone(query)
+        if digits and PHONE_PUNCTUATION.sub("", query).isdigit():
+            found = self.phone_keys.prefix(digits, limit) + self.phone_keys.prefix("~" + digits[::-1], limit)
+            # Shortest (closest to complete) numbers first.
+            found.sort(key=lambda pair: len(pair[0]))
+        else:
+            found = self.name_keys.prefix(normalize_name(query), limit)
+            found.sort(key=lambda pair: (pair[0] != self.names[pair[1]], len(pair[0]), pair[0]))
+        results = []
+        for _, number in found:
+            user_id = self.user_ids[number]
+            if user_id not in results:
+                results.append(user_id)
+                if len(results) >= limit:
+                    break
+        return results
+
+    def fuzzy(self, query, limit=10):
+        """(user_id, similarity) for the names closest to query by shared trigrams, best first."""
+        grams = trigrams(normalize_name(query))
+        postings = sorted((self.postings[gram] for gram in grams if gram in self.postings), key=len)
+        hits = Counter()
+        scanned = 0
+        for posting in postings:
+            if scanned and scanned + len(posting) > self.SCAN_LIMIT:
+                break
+            hits.update(posting)
+            scanned += len(posting)
+        scored = []
+        for number, _ in hits.most_common(limit * 20):
+            name_grams = trigrams(self.names[number])
+            shared = len(grams & name_grams)
+            scored.append((shared / (len(grams) + len(name_grams) - shared), number))
+        return [(self.user_ids[number], round(score, 3)) for score, number in heapq.nlargest(limit, scored)]
+
+    def search(self, query, limit=10):
+        """Prefix matches first, topped up with fuzzy matches."""
+        results = self.prefix(query, limit)
+        if len(results) < limit:
+            for user_id, _ in self.fuzzy(query, limit):
+                if user_id not in results:
+                    results.append(user_id)
+                    if len(results) >= limit:
+                        break
+        return results
+
+    def __len__(self):
+        return len(self.user_ids)
@@ -0,0 +1,181 @@
+import threading
+from bisect import bisect_right
+
+
+class Snapshot:
+    """An immutable point-in-time view of balances and transaction history.
+
+    Holds the epoch it was taken at and the history list with its length at
+    that epoch. Transfers that commit later are invisible to it. Close the
+    snapshot (or use it as a context manager) so old balance versions can
+    be discarded.
+    """
+
+    def __init__(self, manager, epoch, transactions, length):
+        self.manager = manager
+        self.epoch = epoch
+        self._transactions = transactions
+        self._length = length
+
+    def balance(self, user_id):
+        """The user's balance as of this snapshot, or None if the user is unknown or registered later."""
+        user = self.manager.system.users.get(user_id)
+        if user is None:
+            return None
+        # Read the live wallet before looking for versions: a writer records
+        # the pre-image before touching the wallet, so if no versions exist
+        # after this read, the balance read was not yet modified.
+        balance = user.wallet.check_balance()
+        versions = self.manager.versions.get(user_id)
+        if versions is None:
+            return balance
+        return versions[bisect_right(versions, (self.epoch, float("inf"))) - 1][1]
+
+    def balances(self):
+        """Yield (user_id, balance) for every user, all as of this snapshot."""
+        for user_id in list(self.manager.system.users):
+            balance = self.balance(user_id)
+            if balance is not None:
+                yield user_id, balance
+
+    def history(self, user_id=None):
+        """Yield transactions committed up to this snapshot, optionally only those involving user_id."""
+        transactions = self._transactions
+        for i in range(self._length):
+            transaction = transactions[i]
+            if user_id is None or user_id in (transaction.sender_id, transaction.receiver_id):
+                yield transaction
+
+    def __len__(self):
+        return self._length
+
+    def close(self):
+        self.manager._release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SnapshotManager:
+    """Multi-version balances so readers never take the write lock.
+
+    Writers (serialised among themselves as before) call before_write()
+    with the users they are about to change, mutate wallets and history,
+    then publish(). publish() appends each user's new balance to that
+    user's version list under the next epoch, then swaps in one
+    (epoch, transactions, length) tuple. Readers take that tuple as their
+    snapshot and resolve balances by binary search on the version lists,
+    so a long statement export sees a consistent state while transfers
+    keep committing. Version lists are trimmed copy-on-write once no
+    snapshot needs the older entries.
+    """
+
+    TRIM_AT = 16
+
+    def __init__(self, system):
+        self.system = system
+        self.versions = {}
+        self._active = {}
+        self._lock = threading.Lock()
+        self._state = (0, system.transactions, len(system.transactions))
+        system.snapshots = self
+
+    @property
+    def epoch(self):
+        return self._state[0]
+
+    def snapshot(self):
+        with self._lock:
+            epoch, transactions, length = self._state
+            snapshot = Snapshot(self, epoch, transactions, length)
+            self._active[id(snapshot)] = epoch
+        return snapshot
+
+    def _release(self, snapshot):
+        with self._lock:
+            self._active.pop(id(snapshot), None)
+
+    def _oldest_active(self):
+        with self._lock:
+            return min(self._active.values(), default=self.epoch)
+
+    def before_write(self, users, new=False):
+        """Record the current balance as the base version of users changed for the first time.
+
+        The base version is valid for every earlier epoch, hence epoch -1.
+        For new users it is None: they did not exist at any earlier epoch,
+        so older snapshots leave them out. Call it before a new user is
+        added to system.users.
+        """
+        for user in users:
+            if new:
+                self.versions[user.user_id] = [(-1, None)]
+            elif user.user_id not in self.versions:
+                self.versions[user.user_id] = [(-1, user.wallet.check_balance())]
+
+    def publish(self, users=()):
+        """Make the writes to users and any new transactions visible to new snapshots."""
+        epoch = self.epoch + 1
+        oldest = None
+        for user in users:
+            versions = self.versions[user.user_id]
+            versions.append((epoch, user.wallet.check_balance()))
+            if len(versions) > self.TRIM_AT:
+                if oldest is None:
+                    oldest = self._oldest_active()
+                keep = max(bisect_right(versions, (oldest, float("inf"))) - 1, 0)
+                if keep:
+                    self.versions[user.user_id] = versions[keep:]
+        self._state = (epoch, self.system.transactions, len(self.system.transactions))
+
+
+def export_drill(users=2000, transfers=20000):
+    """Time transfers while a deliberately slow statement export reads a snapshot."""
+    import os
+    import tempfile
+    import time
+
+    from payment_core import create_system, load_core
+
+    with tempfile.TemporaryDirectory() as directory:
+        system = create_system(os.path.join(directory, "users.xlsx"), os.path.join(directory, "transactions.xlsx"))
+        core = load_core()
+        for i in range(users):
+            user_id = f"D{i:05d}"
+            system.users[user_id] = core.User(user_id, f"Drill {i}", "", system._new_wallet(user_id, 1000.0))
+        manager = SnapshotManager(system)
+        snapshot = manager.snapshot()
+        total_before = sum(balance for _, balance in snapshot.balances())
+        done = threading.Event()
+        export = {}
+
+        def slow_export():
+            total = 0.0
+            for _, balance in snapshot.balances():
+                total += balance
+                time.sleep(0.0005)
+            export["total"] = total
+            export["rows"] = sum(1 for _ in snapshot.history())
+            snapshot.close()
+            done.set()
+
+        reader = threading.Thread(target=slow_export)
+        reader.start()
+        started = time.perf_counter()
+        for i in range(transfers):
+            system.transfer(f"D{i % users:05d}", f"D{(i * 7 + 1) % users:05d}", 1.0, persist=False)
+        elapsed = time.perf_counter() - started
+        export_running = not done.is_set()
+        reader.join()
+        print(f"{transfers} transfers in {elapsed:.2f}s ({transfers / elapsed:.0f}/s) "
+              f"with the export still running: {export_running}")
+        print(f"snapshot total {export['total']:.2f} == total at snapshot {total_before:.2f}: "
+              f"{abs(export['total'] - total_before) < 1e-6}; history rows seen {export['rows']} "
+              f"(live {len(system.transactions)})")
+
+
+if __name__ == "__main__":
+    export_drill()
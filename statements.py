@@ -0,0 +1,193 @@
+import hashlib
+import os
+import struct
+import sys
+from bisect import bisect_left
+from collections import OrderedDict
+
+from archive import transaction_number
+from time_index import format_epoch_us, to_epoch_us
+
+# timestamp (epoch microseconds), transaction number (0 for deposits), signed amount in paisa
+RECORD = struct.Struct("<qqq")
+# record position, timestamp of that record, balance in paisa just before it
+CHECKPOINT = struct.Struct("<qqq")
+
+
+def to_paisa(amount):
+    return int(round(amount * 100))
+
+
+class StatementStore:
+    """Per-user running statements written as money moves.
+
+    Each user has a .bin file of fixed-size movement records in time order
+    and a .idx file holding the balance before every CHECKPOINT_EVERY-th
+    record. A statement for [start, end] binary-searches the checkpoints
+    for the last one at or before start, seeks to its record, and streams
+    forward from there to compute running balances. The ledger is never
+    replayed. Writes are buffered in a bounded set of open files, which are
+    flushed with the rest of the system's persistence.
+
+    File names are a hash of the user ID, so no ID can name a path outside
+    directory. A checkpoint is written through before the record it points
+    at, so after a crash the .idx can only run ahead of the .bin. The first
+    time a user's files are touched, any torn trailing record and any
+    checkpoint past the last complete record are cut off.
+    """
+
+    CHECKPOINT_EVERY = 64
+    OPEN_FILES = 256
+
+    def __init__(self, directory="statements"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._files = OrderedDict()
+        self._counts = {}
+
+    def _path(self, user_id, suffix):
+        name = hashlib.blake2b(str(user_id).encode(), digest_size=16).hexdigest()
+        return os.path.join(self.directory, name + suffix)
+
+    def _open(self, user_id):
+        files = self._files.pop(user_id, None)
+        if files is None:
+            if len(self._files) >= self.OPEN_FILES:
+                _, (records, index) = self._files.popitem(last=False)
+                records.close()
+                index.close()
+            files = (open(self._path(user_id, ".bin"), "ab"), open(self._path(user_id, ".idx"), "ab"))
+        self._files[user_id] = files
+        return files
+
+    def _count(self, user_id):
+        count = self._counts.get(user_id)
+        if count is None:
+            count = self._repair(user_id)
+            self._counts[user_id] = count
+        return count
+
+    def _repair(self, user_id):
+        """Trim what a crash may have left half-written; returns the number of complete records."""
+        records_path, index_path = self._path(user_id, ".bin"), self._path(user_id, ".idx")
+        count = 0
+        if os.path.exists(records_path):
+            count = os.path.getsize(records_path) // RECORD.size
+            os.truncate(records_path, count * RECORD.size)
+        if os.path.exists(index_path):
+            # Checkpoints are written every CHECKPOINT_EVERY records from position 0.
+            checkpoints = -(-count // self.CHECKPOINT_EVERY)
+            if os.path.getsize(index_path) > checkpoints * CHECKPOINT.size:
+                os.truncate(index_path, checkpoints * CHECKPOINT.size)
+        return count
+
+    def record(self, user_id, timestamp, transaction_id, amount, balance_after):
+        """Append one movement (negative amount for money out) and the balance it left."""
+        count = self._count(user_id)
+        records, index = self._open(user_id)
+        change = to_paisa(amount)
+        if count % self.CHECKPOINT_EVERY == 0:
+            index.write(CHECKPOINT.pack(count, timestamp, to_paisa(balance_after) - change))
+            index.flush()
+        records.write(RECORD.pack(timestamp, transaction_number(transaction_id) if transaction_id else 0, change))
+        self._counts[user_id] = count + 1
+
+    def recorded(self, user_id, since):
+        """(timestamp, transaction number) of every movement recorded for user_id at or after since."""
+        start = self._start(user_id, since)
+        if start is None:
+            return set()
+        with open(self._path(user_id, ".bin"), "rb") as f:
+            f.seek(start[0] * RECORD.size)
+            return {(timestamp, number) for timestamp, number, _ in self._stream(f) if timestamp >= since}
+
+    def _start(self, user_id, start_us):
+        """(record position, balance before it) to stream from to reach start_us, or None without records."""
+        self._count(user_id)
+        files = self._files.get(user_id)
+        if files is not None:
+            files[1].flush()
+            files[0].flush()
+        checkpoints = self._checkpoints(user_id)
+        if not checkpoints:
+            return None
+        position = 0
+        if start_us is not None:
+            # Checkpoint timestamps rise with position, so bisect for the last one before start.
+            position = max(bisect_left([c[1] for c in checkpoints], start_us) - 1, 0)
+        first, _, balance = checkpoints[position]
+        return first, balance
+
+    def _checkpoints(self, user_id):
+        path = self._path(user_id, ".idx")
+        if not os.path.exists(path):
+            return []
+        with open(path, "rb") as f:
+            data = f.read()
+        return [CHECKPOINT.unpack_from(data, offset)
+                for offset in range(0, len(data) - len(data) % CHECKPOINT.size, CHECKPOINT.size)]
+
+    def statement(self, user_id, start=None, end=None):
+        """Return (opening_balance, rows, closing_balance) for movements within [start, end].
+
+        rows is a list of (date, transaction_id, amount, running_balance).
+        Returns None if the user has no recorded movements.
+        """
+        start_us = to_epoch_us(start) if start is not None else None
+        end_us = to_epoch_us(end) if end is not None else None
+        seek_to = self._start(user_id, start_us)
+        if seek_to is None:
+            return None
+        first, balance = seek_to
+        opening = None
+        rows = []
+        with open(self._path(user_id, ".bin"), "rb") as f:
+            f.seek(first * RECORD.size)
+            for timestamp, number, change in self._stream(f):
+                if start_us is not None and timestamp < start_us:
+                    balance += change
+                    continue
+                if end_us is not None and timestamp > end_us:
+                    break
+                if opening is None:
+                    opening = balance
+                balance += change
+                rows.append((format_epoch_us(timestamp), f"T{number:03d}" if number else "",
+                             change / 100, balance / 100))
+        if opening is None:
+            opening = balance
+        return opening / 100, rows, balance / 100
+
+    @staticmethod
+    def _stream(f, chunk_records=4096):
+        while True:
+            chunk = f.read(RECORD.size * chunk_records)
+            if not chunk:
+                return
+            yield from RECORD.iter_unpack(chunk[:len(chunk) - len(chunk) % RECORD.size])
+
+    def flush(self):
+        for records, index in self._files.values():
+            index.flush()
+            records.flush()
+
+    def close(self):
+        for records, index in self._files.values():
+            records.close()
+            index.close()
+        self._files.clear()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 4):
+        print("Usage: python statements.py <user_id> [<start> <end>]")
+        sys.exit(1)
+    result = StatementStore().statement(sys.argv[1], *sys.argv[2:4])
+    if result is None:
+        print("No statement recorded for this user.")
+        sys.exit(1)
+    opening, rows, closing = result
+    print(f"Opening balance: {opening:.2f}")
+    for date, transaction_id, amount, balance in rows:
+        print(f"{date}  {transaction_id:>8}  {amount:>12.2f}  {balance:>12.2f}")
+    print(f"Closing balance: {closing:.2f}")
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def core():
+    from payment_core import load_core
+
+    return load_core()
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory so default file names (journal.log, events.log...) stay isolated."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,50 @@
+import threading
+
+import pytest
+
+from admission import AdmissionController, Overloaded
+from request_scheduler import RequestScheduler
+
+
+def test_scheduler_rejects_beyond_admission_limit():
+    controller = AdmissionController(initial_limit=2, min_limit=1)
+    scheduler = RequestScheduler(workers=1, admission=controller)
+    gate = threading.Event()
+    first = scheduler.submit("interactive", gate.wait)
+    second = scheduler.submit("interactive", gate.wait)
+    with pytest.raises(Overloaded):
+        scheduler.submit("interactive", gate.wait)
+    gate.set()
+    first.result()
+    second.result()
+    scheduler.shutdown()
+    assert controller.in_flight == 0
+    assert controller.metrics()["rejected"] == 1
+
+
+def test_slow_requests_shrink_the_limit():
+    controller = AdmissionController(target_latency=0.0, initial_limit=8, min_limit=1)
+    scheduler = RequestScheduler(workers=1, admission=controller)
+    for _ in range(4):
+        scheduler.submit("interactive", lambda: None).result()
+    scheduler.shutdown()
+    assert controller.limit < 8
+
+
+def test_reads_meet_the_interactive_slo_while_a_long_batch_holds_the_core():
+    scheduler = RequestScheduler()
+    held = threading.Event()
+    release = threading.Event()
+
+    def long_batch():
+        held.set()
+        release.wait()
+
+    batch = scheduler.submit("batch", long_batch)
+    held.wait()
+    reads = [scheduler.submit_read("interactive", lambda: 100.0) for _ in range(50)]
+    assert [future.result(timeout=1) for future in reads] == [100.0] * 50
+    assert scheduler.meets_slo("interactive")
+    release.set()
+    batch.result()
+    scheduler.shutdown()
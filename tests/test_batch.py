@@ -0,0 +1,75 @@
+import io
+import json
+
+from batch import BatchRunner
+from recovery import Journal
+
+
+def run(system, lines, checkpoint_every=None):
+    out = io.StringIO()
+    BatchRunner(system, out, checkpoint_every).run(lines)
+    return [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+def make_system(core, **components):
+    system = core.MobilePaymentSystem(**components)
+    system.add_user("1", "Payer", "0100", 0.0, persist=False)
+    system.add_user("2", "Payee", "0200", 500.0, persist=False)
+    return system
+
+
+def test_non_positive_and_non_finite_amounts_are_rejected(core, workdir):
+    system = make_system(core)
+    results = run(system, [
+        '{"op": "send", "sender": "1", "receiver": "2", "amount": -400}',
+        '{"op": "send", "sender": "2", "receiver": "1", "amount": "nan"}',
+        '{"op": "receive", "user_id": "2", "amount": -50}',
+        '{"op": "receive", "user_id": "2", "amount": "inf"}',
+    ])
+    assert [result["ok"] for result in results] == [False] * 4
+    assert results[0]["error"] == "Amount must be a positive number."
+    assert system.users["1"].wallet.check_balance() == 0.0
+    assert system.users["2"].wallet.check_balance() == 500.0
+
+
+def test_non_object_json_gives_an_error_result(core, workdir):
+    system = make_system(core)
+    results = run(system, ['[1, 2]', '"send"', '{"op": "balance", "user_id": 2}'])
+    assert results[0] == {"ok": False, "error": "A command must be a JSON object."}
+    assert results[1]["ok"] is False
+    assert results[2] == {"ok": True, "balance": 500.0}
+
+
+def test_history_accepts_numeric_ids(core, workdir):
+    system = make_system(core)
+    results = run(system, ['{"op": "send", "sender": "2", "receiver": "1", "amount": 5}',
+                           '{"op": "history", "user_id": 1}'])
+    assert [row[0] for row in results[1]["transactions"]] == ["T001"]
+
+
+def test_intermediate_checkpoints_do_not_rewrite_the_ledger(core, workdir):
+    system = make_system(core, journal=Journal(sync=False))
+    saves = []
+    save_transactions = system.save_transactions
+    system.save_transactions = lambda: saves.append(1) or save_transactions()
+    results = run(system, ['{"op": "send", "sender": "2", "receiver": "1", "amount": 1}'] * 10,
+                  checkpoint_every=2)
+    assert all(result["ok"] for result in results)
+    assert len(saves) == 1
+    assert list(system.journal.entries()) == []
+
+
+def test_invalid_opening_balances_are_rejected(core, workdir):
+    system = make_system(core, journal=Journal(sync=False))
+    results = run(system, [
+        '{"op": "register", "user_id": "3", "balance": "nan"}',
+        '{"op": "register", "user_id": "4", "balance": -10}',
+        '{"op": "register", "user_id": "5", "balance": true}',
+        '{"op": "send", "sender": "2", "receiver": "1", "amount": true}',
+        '{"op": "register", "user_id": "6"}',
+        '{"op": "register", "user_id": "6", "balance": 5}',
+    ])
+    assert results[:4] == [{"ok": False, "error": "Initial balance must be a non-negative number."}] * 3 + [
+        {"ok": False, "error": "Amount must be a positive number."}]
+    assert results[4:] == [{"ok": True}, {"ok": False, "error": "User ID already exists."}]
+    assert set(system.users) == {"1", "2", "6"}
@@ -0,0 +1,29 @@
+from fees import FeeEngine
+from holds import HoldManager
+
+
+def make_system(core, balance):
+    system = core.MobilePaymentSystem(fee_engine=FeeEngine())
+    system.users["P"] = core.User("P", "Payer", "0100", core.Wallet(balance))
+    system.users["M"] = core.User("M", "Merchant", "0200", core.Wallet(0.0))
+    return system
+
+
+def test_hold_reserves_the_fee_and_can_be_captured(core, workdir):
+    fee = FeeEngine().fee("merchant_payment", 2000.0)
+    assert fee > 0
+    system = make_system(core, 2000.0 + fee)
+    holds = HoldManager(system)
+    hold = holds.hold("P", "M", 2000.0)
+    assert hold is not None
+    assert holds.available("P") == 0.0
+
+    assert holds.capture(hold.hold_id, persist=False) is not None
+    assert system.users["P"].wallet.check_balance() == 0.0
+    assert system.users["M"].wallet.check_balance() == 2000.0
+    assert holds.held_amount("P") == 0.0
+
+
+def test_hold_without_funds_for_the_fee_is_refused(core, workdir):
+    system = make_system(core, 2000.0)
+    assert HoldManager(system).hold("P", "M", 2000.0) is None
@@ -0,0 +1,49 @@
+from occ import OptimisticTransfers, VersionConflict, VersionedWalletStore
+
+
+def make_system(core):
+    return core.MobilePaymentSystem(wallet_store=VersionedWalletStore())
+
+
+def test_two_writers_do_not_lose_updates(core, workdir):
+    first = make_system(core)
+    first.add_user("A", "Alice", "0100", 1000.0)
+    first.add_user("B", "Bob", "0200", 0.0)
+    second = make_system(core)
+
+    first.transfer("A", "B", 100.0)
+    second.transfer("A", "B", 50.0)
+    first.save_users()
+    second.save_users()
+
+    reloaded = make_system(core)
+    assert reloaded.users["A"].wallet.check_balance() == 850.0
+    assert reloaded.users["B"].wallet.check_balance() == 150.0
+    assert [t.transaction_id for t in reloaded.transactions] == ["T001", "T002"]
+
+
+def test_overdraw_by_a_concurrent_writer_is_refused(core, workdir):
+    first = make_system(core)
+    first.add_user("A", "Alice", "0100", 100.0)
+    first.add_user("B", "Bob", "0200", 0.0)
+    second = make_system(core)
+    second.transfer("A", "B", 80.0)
+
+    assert first.transfer("A", "B", 50.0) is None
+    assert first.last_failure == "Insufficient balance."
+    assert first.users["A"].wallet.check_balance() == 20.0
+
+
+def test_stale_version_is_a_conflict(workdir):
+    store = VersionedWalletStore()
+    engine = OptimisticTransfers(store)
+    store.create("A", 10.0)
+    _, version = store.read("A")
+    engine.apply({"A": 1.0})
+    try:
+        store.commit([("A", version, 5.0)])
+    except VersionConflict:
+        pass
+    else:
+        raise AssertionError("stale write was applied")
+    assert store.read("A")[0] == 11.0
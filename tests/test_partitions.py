@@ -0,0 +1,52 @@
+from datetime import datetime
+
+from partitions import PartitionedLedger
+
+ROWS = [
+    ["T001", "A", "B", 1.0, "2026-01-15 10:00:00"],
+    ["T002", "B", "A", 2.0, "2026-02-15 10:00:00"],
+    ["T003", "A", "B", 3.0, "2026-03-15 10:00:00"],
+    ["T004", "B", "A", 4.0, "2026-03-20 10:00:00"],
+]
+
+
+def make_system(core, opened):
+    setup = core.MobilePaymentSystem()
+    setup.add_user("A", "Payer", "0100", 100.0)
+    setup.add_user("B", "Payee", "0200", 100.0)
+    PartitionedLedger().append(ROWS)
+    ledger = PartitionedLedger(hot_partitions=1)
+    partition_rows = ledger._partition_rows
+    ledger._partition_rows = lambda key: opened.append(key) or partition_rows(key)
+    return core.MobilePaymentSystem(ledger=ledger)
+
+
+def test_startup_loads_only_the_hot_partitions(core, workdir):
+    opened = []
+    system = make_system(core, opened)
+    assert opened == ["2026-03"]
+    assert [t.transaction_id for t in system.transactions] == ["T003", "T004"]
+    assert system._next_transaction_id() == "T005"
+
+
+def test_range_queries_open_only_the_older_partitions_they_reach(core, workdir):
+    opened = []
+    system = make_system(core, opened)
+    del opened[:]
+    found = system.transactions_between(datetime(2026, 2, 1), datetime(2026, 3, 31))
+    assert [t.transaction_id for t in found] == ["T002", "T003", "T004"]
+    assert opened == ["2026-02"]
+    del opened[:]
+    assert system.transactions_between(datetime(2026, 3, 1)) == system.transactions
+    assert opened == []
+
+
+def test_archiving_takes_partitions_that_were_never_loaded(core, workdir):
+    from archive import LedgerArchive
+
+    make_system(core, [])
+    system = core.MobilePaymentSystem(ledger=PartitionedLedger(hot_partitions=1), archive=LedgerArchive())
+    assert system.archive_cold_transactions(max_age_days=30, now=datetime(2026, 4, 10)) == 2
+    assert sorted(system.ledger.partitions) == ["2026-03"]
+    found = system.transactions_between(datetime(2026, 1, 1))
+    assert [t.transaction_id for t in found] == ["T001", "T002", "T003", "T004"]
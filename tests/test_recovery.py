@@ -0,0 +1,218 @@
+import openpyxl
+import pytest
+
+import recovery
+from archive import LedgerArchive
+from balance_table import BalanceTable
+from cdc import EventFeed, FeedConsumer
+from partitions import PartitionedLedger
+from recovery import Journal, recover
+
+
+class SimulatedCrash(Exception):
+    pass
+
+
+def crash(*args, **kwargs):
+    raise SimulatedCrash()
+
+
+def seed_users(core, **components):
+    setup = core.MobilePaymentSystem(**components)
+    setup.users["A"] = core.User("A", "Sender", "0100", setup._new_wallet("A", 1000.0))
+    setup.users["B"] = core.User("B", "Receiver", "0200", setup._new_wallet("B", 500.0))
+    setup.save_users()
+
+
+def start(core, **components):
+    return core.MobilePaymentSystem(journal=Journal(), **components)
+
+
+def restart_and_recover(core, **components):
+    system = start(core, **components)
+    recover(system, system.snapshot_file)
+    system.journal.close()
+    return core.MobilePaymentSystem(**components)
+
+
+def balances(system):
+    return {user_id: user.wallet.check_balance() for user_id, user in system.users.items()}
+
+
+def transaction_ids(system):
+    return [t.transaction_id for t in system.transactions]
+
+
+@pytest.mark.parametrize("owner, attribute", [
+    ("Wallet", "withdraw"),
+    ("User", "receive_money"),
+    ("MobilePaymentSystem", "_record"),
+    ("MobilePaymentSystem", "save_users"),
+    ("MobilePaymentSystem", "save_transactions"),
+])
+def test_crash_at_each_transfer_stage(core, workdir, monkeypatch, owner, attribute):
+    seed_users(core)
+    system = start(core)
+    system.transfer("A", "B", 100.0)
+    with monkeypatch.context() as patch:
+        patch.setattr(getattr(core, owner), attribute, crash)
+        with pytest.raises(SimulatedCrash):
+            system.transfer("A", "B", 50.0)
+    system.journal.close()
+
+    reloaded = restart_and_recover(core)
+    assert balances(reloaded) == {"A": 850.0, "B": 650.0}
+    assert transaction_ids(reloaded) == ["T001", "T002"]
+
+
+@pytest.mark.parametrize("owner, attribute", [
+    ("MobilePaymentSystem", "save_users"),
+    ("MobilePaymentSystem", "save_transactions"),
+    ("recovery", "write_snapshot"),
+    ("Journal", "truncate"),
+])
+def test_crash_at_each_checkpoint_stage(core, workdir, monkeypatch, owner, attribute):
+    seed_users(core)
+    system = start(core)
+    system.deposit("A", 50.0)
+    system.transfer("A", "B", 10.0)
+    targets = {"recovery": recovery, "Journal": Journal}
+    with monkeypatch.context() as patch:
+        patch.setattr(targets.get(owner) or getattr(core, owner), attribute, crash)
+        with pytest.raises(SimulatedCrash):
+            recovery.checkpoint(system, system.snapshot_file)
+    system.journal.close()
+
+    reloaded = restart_and_recover(core)
+    assert balances(reloaded) == {"A": 1040.0, "B": 510.0}
+    assert transaction_ids(reloaded) == ["T001"]
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnraisableExceptionWarning")
+def test_crash_mid_save_leaves_previous_workbook_readable(core, workdir, monkeypatch):
+    seed_users(core)
+    system = start(core)
+    system.transfer("A", "B", 100.0)
+
+    def torn_save(workbook, filename):
+        with open(filename, "wb") as f:
+            f.write(b"PK\x03\x04 torn")
+        raise SimulatedCrash()
+
+    with monkeypatch.context() as patch:
+        patch.setattr(openpyxl.Workbook, "save", torn_save)
+        with pytest.raises(SimulatedCrash):
+            system.transfer("A", "B", 50.0)
+    system.journal.close()
+
+    openpyxl.load_workbook("users.xlsx").close()
+    reloaded = restart_and_recover(core)
+    assert balances(reloaded) == {"A": 850.0, "B": 650.0}
+    assert transaction_ids(reloaded) == ["T001", "T002"]
+
+
+def test_torn_journal_line_is_ignored(core, workdir):
+    seed_users(core)
+    system = start(core)
+    with pytest.raises(SimulatedCrash):
+        system.save_users = crash
+        system.transfer("A", "B", 100.0)
+    system.journal.close()
+    with open("journal.log", "a", encoding="utf-8") as f:
+        f.write('{"type": "transfer", "id": "T00')
+
+    reloaded = restart_and_recover(core)
+    assert balances(reloaded) == {"A": 900.0, "B": 600.0}
+    assert transaction_ids(reloaded) == ["T001"]
+
+
+def test_partitioned_ledger_is_not_appended_twice(core, workdir):
+    seed_users(core, ledger=PartitionedLedger())
+    system = start(core, ledger=PartitionedLedger())
+    system.transfer("A", "B", 10.0)
+    system.transfer("A", "B", 20.0)
+    system.save_transactions = crash
+    with pytest.raises(SimulatedCrash):
+        system.transfer("A", "B", 30.0)
+    system.journal.close()
+
+    reloaded = restart_and_recover(core, ledger=PartitionedLedger())
+    assert [row[0] for row in PartitionedLedger().rows()] == ["T001", "T002", "T003"]
+    assert transaction_ids(reloaded) == ["T001", "T002", "T003"]
+    assert balances(reloaded) == {"A": 940.0, "B": 560.0}
+
+
+def test_recovery_with_archived_transactions(core, workdir):
+    seed_users(core)
+    system = start(core, archive=LedgerArchive())
+    for _ in range(3):
+        transaction = system.transfer("A", "B", 10.0)
+        transaction.timestamp -= 365 * 86400 * 1_000_000
+    assert system.archive_cold_transactions() == 3
+    system.save_users = crash
+    with pytest.raises(SimulatedCrash):
+        system.transfer("A", "B", 5.0)
+    system.journal.close()
+
+    reloaded = restart_and_recover(core, archive=LedgerArchive())
+    assert balances(reloaded) == {"A": 965.0, "B": 535.0}
+    assert transaction_ids(reloaded) == ["T004"]
+    assert reloaded.transfer("A", "B", 1.0).transaction_id == "T005"
+
+
+def test_recovered_balances_reach_the_balance_table(core, workdir):
+    seed_users(core, balance_table=BalanceTable())
+    system = start(core, balance_table=BalanceTable())
+    system.transfer("A", "B", 100.0)
+    system.save_users = crash
+    with pytest.raises(SimulatedCrash):
+        system.transfer("A", "B", 50.0)
+    system.journal.close()
+    # The crash happened after the mapped balances changed, as an abrupt exit would leave them.
+    restart_and_recover(core, balance_table=BalanceTable())
+
+    reloaded = core.MobilePaymentSystem(balance_table=BalanceTable())
+    assert balances(reloaded) == {"A": 850.0, "B": 650.0}
+
+
+def test_recovery_rebuilds_search_index(core, workdir):
+    from search_index import SearchIndex
+
+    seed_users(core)
+    system = start(core)
+    system.add_user("C", "Late Joiner", "0300", 0.0, persist=False)
+    system.journal.close()
+
+    index = SearchIndex()
+    recovered = start(core, search_index=index)
+    recover(recovered, recovered.snapshot_file)
+    assert index.search("late") == ["C"]
+
+
+def test_replayed_events_are_published_once(core, workdir, monkeypatch):
+    seed_users(core)
+    system = start(core, event_feed=EventFeed())
+    system.transfer("A", "B", 100.0)
+    system.save_users = crash
+    with pytest.raises(SimulatedCrash):
+        system.transfer("A", "B", 50.0)
+    with pytest.raises(SimulatedCrash):
+        system.deposit("B", 25.0)
+    system.journal.close()
+    system.event_feed.close()
+
+    # The first recovery publishes the missing events, then crashes before its checkpoint.
+    crashed = start(core, event_feed=EventFeed())
+    with monkeypatch.context() as patch:
+        patch.setattr(recovery, "checkpoint", crash)
+        with pytest.raises(SimulatedCrash):
+            recover(crashed, crashed.snapshot_file)
+    crashed.journal.close()
+    crashed.event_feed.close()
+    restart_and_recover(core, event_feed=EventFeed())
+
+    events, _ = FeedConsumer("test").poll()
+    assert [event["type"] for event in events] == ["transfer", "transfer", "deposit"]
+    assert [event["event_id"] for event in events][:2] == ["T001", "T002"]
+    assert events[2]["event_id"].startswith("D")
+    assert [event["sequence"] for event in events] == [1, 2, 3]
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from recovery import Journal, recover
+from scheduler import ScheduleStore, TransferScheduler
+
+NOW = datetime(2026, 3, 1, 9, 0)
+
+
+class SimulatedCrash(Exception):
+    pass
+
+
+def crash(*args, **kwargs):
+    raise SimulatedCrash()
+
+
+def seed_users(core):
+    setup = core.MobilePaymentSystem()
+    setup.users["A"] = core.User("A", "Payer", "0100", core.Wallet(1000.0))
+    setup.users["B"] = core.User("B", "Landlord", "0200", core.Wallet(0.0))
+    setup.save_users()
+
+
+def restart(core, journal=False):
+    if not journal:
+        return core.MobilePaymentSystem()
+    system = core.MobilePaymentSystem(journal=Journal())
+    recover(system, system.snapshot_file)
+    return system
+
+
+def balances(system):
+    return {user_id: user.wallet.check_balance() for user_id, user in system.users.items()}
+
+
+@pytest.mark.parametrize("journal", [False, True])
+def test_crash_before_schedules_advance_does_not_pay_twice(core, workdir, monkeypatch, journal):
+    seed_users(core)
+    system = restart(core, journal)
+    scheduler = TransferScheduler(system)
+    schedule = scheduler.add("A", "B", 100.0, NOW - timedelta(minutes=1), "monthly")
+    original = ScheduleStore.save
+
+    def save_pending_only(store, schedules=(), removed=()):
+        if any(s.pending_after is None for s in schedules):
+            crash()
+        original(store, schedules, removed)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(ScheduleStore, "save", save_pending_only)
+        with pytest.raises(SimulatedCrash):
+            scheduler.run_due(NOW)
+    scheduler.store.close()
+
+    system = restart(core, journal)
+    scheduler = TransferScheduler(system)
+    assert scheduler.schedules[schedule.schedule_id].next_run == datetime(2026, 4, 1, 8, 59)
+    assert scheduler.run_due(NOW) == ([], [])
+    assert balances(system) == {"A": 900.0, "B": 100.0}
+
+
+def test_crash_before_transfers_are_saved_pays_on_restart(core, workdir, monkeypatch):
+    seed_users(core)
+    scheduler = TransferScheduler(core.MobilePaymentSystem())
+    schedule = scheduler.add("A", "B", 100.0, NOW - timedelta(minutes=1))
+    with monkeypatch.context() as patch:
+        patch.setattr(core.MobilePaymentSystem, "save_users", crash)
+        with pytest.raises(SimulatedCrash):
+            scheduler.run_due(NOW)
+    scheduler.store.close()
+
+    system = core.MobilePaymentSystem()
+    scheduler = TransferScheduler(system)
+    assert scheduler.schedules[schedule.schedule_id].pending_after is None
+    assert scheduler.run_due(NOW) == ([schedule.schedule_id], [])
+    assert balances(system) == {"A": 900.0, "B": 100.0}
+    assert schedule.schedule_id not in TransferScheduler(system).schedules
+
+
+def test_tick_writes_only_the_fired_schedules(core, workdir, monkeypatch):
+    seed_users(core)
+    system = core.MobilePaymentSystem(journal=Journal())
+    scheduler = TransferScheduler(system)
+    for day in range(1, 200):
+        scheduler.add("A", "B", 1.0, NOW + timedelta(days=day))
+    due = scheduler.add("A", "B", 5.0, NOW, "weekly")
+    written = []
+    original = ScheduleStore.save
+    monkeypatch.setattr(ScheduleStore, "save", lambda self, schedules=(), removed=():
+                        written.append(len(schedules) + len(removed)) or original(self, schedules, removed))
+    monkeypatch.setattr(core.MobilePaymentSystem, "save_users", crash)
+    assert scheduler.run_due(NOW) == ([due.schedule_id], [])
+    assert written == [1, 1]
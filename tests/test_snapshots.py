@@ -0,0 +1,15 @@
+from snapshots import SnapshotManager
+
+
+def test_snapshot_leaves_out_users_registered_after_it(core, workdir):
+    system = core.MobilePaymentSystem()
+    system.add_user("A", "Sender", "0100", 1000.0, persist=False)
+    system.add_user("B", "Receiver", "0200", 500.0, persist=False)
+    manager = SnapshotManager(system)
+    with manager.snapshot() as snapshot:
+        system.add_user("C", "Late", "0300", 1000.0, persist=False)
+        system.transfer("C", "A", 100.0, persist=False)
+        assert snapshot.balance("C") is None
+        assert dict(snapshot.balances()) == {"A": 1000.0, "B": 500.0}
+    with manager.snapshot() as snapshot:
+        assert dict(snapshot.balances()) == {"A": 1100.0, "B": 500.0, "C": 900.0}
@@ -0,0 +1,100 @@
+import os
+import random
+
+import pytest
+
+from recovery import Journal, recover
+from statements import RECORD, StatementStore
+
+BASE = 1_700_000_000_000_000
+
+
+@pytest.fixture
+def store(workdir, monkeypatch):
+    monkeypatch.setattr(StatementStore, "CHECKPOINT_EVERY", 4)
+    store = StatementStore()
+    yield store
+    store.close()
+
+
+def record_movements(store, count, seed=7):
+    rng = random.Random(seed)
+    balance, movements, timestamp = 1000.0, [], BASE
+    for number in range(1, count + 1):
+        timestamp += rng.randint(1, 5_000_000)
+        amount = round(rng.uniform(-50, 60), 2)
+        balance = round(balance + amount, 2)
+        store.record("A", timestamp, f"T{number:03d}", amount, balance)
+        movements.append((timestamp, amount, balance))
+    return movements
+
+
+def test_random_ranges_match_a_full_replay(store):
+    movements = record_movements(store, 300)
+    rng = random.Random(11)
+    for _ in range(200):
+        start, end = sorted(rng.randint(BASE - 10, movements[-1][0] + 10) for _ in range(2))
+        opening, rows, closing = store.statement("A", start, end)
+        inside = [m for m in movements if start <= m[0] <= end]
+        before = [m for m in movements if m[0] < start]
+        expected_opening = before[-1][2] if before else 1000.0
+        assert opening == pytest.approx(expected_opening)
+        assert [row[2] for row in rows] == pytest.approx([m[1] for m in inside])
+        assert [row[3] for row in rows] == pytest.approx([m[2] for m in inside])
+        assert closing == pytest.approx(inside[-1][2] if inside else expected_opening)
+
+
+def test_user_ids_cannot_escape_the_directory(store):
+    store.record("../escape", BASE, "T001", 5.0, 5.0)
+    store.flush()
+    assert not os.path.exists("escape.bin")
+    assert len(os.listdir("statements")) == 2
+    assert store.statement("../escape")[2] == 5.0
+
+
+def test_torn_files_are_trimmed_on_reopen(store):
+    movements = record_movements(store, 10)
+    store.close()
+    (bin_path,) = [os.path.join("statements", name) for name in os.listdir("statements") if name.endswith(".bin")]
+    with open(bin_path, "ab") as f:
+        f.write(b"\x01" * (RECORD.size // 2))
+    with open(bin_path[:-4] + ".idx", "ab") as f:
+        f.write(b"\x02" * 24 * 3)
+
+    reopened = StatementStore()
+    reopened.record("A", movements[-1][0] + 1, "T011", 1.0, movements[-1][2] + 1.0)
+    opening, rows, closing = reopened.statement("A")
+    reopened.close()
+    assert opening == pytest.approx(1000.0)
+    assert len(rows) == 11
+    assert closing == pytest.approx(movements[-1][2] + 1.0)
+
+
+def crashed_transfer(core, record_before_crash):
+    system = core.MobilePaymentSystem(journal=Journal(), statements=StatementStore())
+    system.add_user("A", "Sender", "0100", 1000.0)
+    system.add_user("B", "Receiver", "0200", 0.0)
+    system.transfer("A", "B", 100.0)
+    if not record_before_crash:
+        system._record_statements = lambda *args: None
+
+    def crash():
+        raise RuntimeError("crash")
+
+    system.save_users = crash
+    with pytest.raises(RuntimeError):
+        system.transfer("A", "B", 50.0)
+    system.journal.close()
+    system.statements.close()
+
+
+@pytest.mark.parametrize("record_before_crash", [True, False])
+def test_recovery_records_each_replayed_movement_once(core, workdir, record_before_crash):
+    crashed_transfer(core, record_before_crash)
+    statements = StatementStore()
+    system = core.MobilePaymentSystem(journal=Journal(), statements=statements)
+    recover(system, system.snapshot_file)
+    _, rows, closing = statements.statement("A")
+    assert [(row[1], row[2]) for row in rows] == [("T001", -100.0), ("T002", -50.0)]
+    assert closing == 850.0
+    assert [row[1] for row in statements.statement("B")[1]] == ["T001", "T002"]
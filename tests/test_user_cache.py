@@ -0,0 +1,65 @@
+import gc
+import weakref
+
+import pytest
+
+from user_cache import LazyUserRepository, UserStore
+
+
+def test_evicted_users_are_not_pinned_by_the_ledger(core, workdir):
+    store = UserStore()
+    store.put_many([(f"U{i}", f"User {i}", "", 100.0) for i in range(10)])
+    repository = LazyUserRepository(store, capacity=3)
+    system = core.MobilePaymentSystem(user_repository=repository)
+    first = system.users["U0"]
+    system.transfer("U0", "U1", 10.0, persist=False)
+    evicted = weakref.ref(first)
+    del first
+    for i in range(3, 10):
+        system.users[f"U{i}"]
+    gc.collect()
+    assert evicted() is None
+
+    # The transaction resolves the re-faulted user, with its written-back balance.
+    transaction = system.transactions[-1]
+    assert transaction.sender is system.users["U0"]
+    assert transaction.sender.wallet.check_balance() == 90.0
+    assert repository.metrics()["cached"] <= 3
+
+
+def test_users_held_by_a_transfer_are_not_evicted(core, workdir):
+    from fees import FEE_ACCOUNT_ID, FeeEngine
+
+    store = UserStore()
+    store.put_many([("A", "Payer", "", 1000.0), ("B", "Payee", "", 0.0)])
+    repository = LazyUserRepository(store, capacity=3)
+    system = core.MobilePaymentSystem(user_repository=repository, fee_engine=FeeEngine())
+    system.users["X"] = core.User("X", "Other", "", core.Wallet(0.0))
+    repository.flush()
+    transaction = system.transfer("A", "B", 500.0, persist=False)
+    fee = system.last_fee
+    assert transaction is not None and fee > 0
+
+    repository.flush()
+    balances = {row[0]: row[3] for row in store.rows()}
+    assert balances["A"] == 500.0 - fee
+    assert balances["B"] == 500.0
+    assert balances[FEE_ACCOUNT_ID] == fee
+    assert sum(balances.values()) == 1000.0
+
+
+def test_pinned_users_survive_eviction(workdir):
+    store = UserStore()
+    store.put_many([(f"U{i}", f"User {i}", "", 100.0) for i in range(6)])
+    repository = LazyUserRepository(store, capacity=3)
+    with repository.pinned(["U0"]):
+        held = repository["U0"]
+        held.wallet.withdraw(40.0)
+        for i in range(1, 6):
+            repository[f"U{i}"]
+        assert repository["U0"] is held
+    repository.flush()
+    assert dict((row[0], row[3]) for row in store.rows())["U0"] == 60.0
+
+    with pytest.raises(ValueError):
+        LazyUserRepository(store, capacity=2)
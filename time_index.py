@@ -0,0 +1,64 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def to_epoch_us(value):
+    """Convert a datetime, "%Y-%m-%d %H:%M:%S" string or epoch int to epoch microseconds.
+
+    Naive datetimes are counted from a naive epoch, so the conversion is exact
+    and does not depend on the local timezone or DST.
+    """
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str):
+        # fromisoformat parses this layout several times faster than strptime.
+        value = datetime.fromisoformat(value)
+    return (value - EPOCH) // MICROSECOND
+
+
+def from_epoch_us(timestamp):
+    return EPOCH + timestamp * MICROSECOND
+
+
+def format_epoch_us(timestamp, fmt=DATE_FORMAT):
+    return from_epoch_us(timestamp).strftime(fmt)
+
+
+class TimeIndex:
+    """Items kept sorted by epoch-microsecond timestamp for range queries.
+
+    Appends in time order are O(1); an out-of-order timestamp is inserted
+    in place. between() bisects both ends, so a query costs O(log n + k)
+    for k results.
+    """
+
+    def __init__(self):
+        self.timestamps = []
+        self.items = []
+
+    def add(self, timestamp, item):
+        if not self.timestamps or timestamp >= self.timestamps[-1]:
+            self.timestamps.append(timestamp)
+            self.items.append(item)
+        else:
+            position = bisect_right(self.timestamps, timestamp)
+            self.timestamps.insert(position, timestamp)
+            self.items.insert(position, item)
+
+    def between(self, start=None, end=None):
+        """Items with start <= timestamp <= end; either bound may be None."""
+        low = 0 if start is None else bisect_left(self.timestamps, to_epoch_us(start))
+        high = len(self.timestamps) if end is None else bisect_right(self.timestamps, to_epoch_us(end))
+        return self.items[low:high]
+
+    def count_between(self, start=None, end=None):
+        low = 0 if start is None else bisect_left(self.timestamps, to_epoch_us(start))
+        high = len(self.timestamps) if end is None else bisect_right(self.timestamps, to_epoch_us(end))
+        return max(high - low, 0)
+
+    def __len__(self):
+        return len(self.timestamps)
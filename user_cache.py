@@ -0,0 +1,173 @@
+import sqlite3
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import openpyxl
+
+
+class UserStore:
+    """Keyed backing store for users (SQLite), so single users can be read without loading all."""
+
+    def __init__(self, filename="users.db"):
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, name TEXT, "
+                                "phone TEXT, balance REAL)")
+
+    def get(self, user_id):
+        return self.connection.execute("SELECT user_id, name, phone, balance FROM users WHERE user_id = ?",
+                                       (user_id,)).fetchone()
+
+    def put_many(self, rows):
+        self.connection.executemany("INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?)", rows)
+        self.connection.commit()
+
+    def rows(self):
+        return self.connection.execute("SELECT user_id, name, phone, balance FROM users ORDER BY user_id")
+
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def import_workbook(self, filename="users.xlsx", batch_size=10000):
+        wb = openpyxl.load_workbook(filename, read_only=True)
+        batch = []
+        for row in wb.active.iter_rows(min_row=2, values_only=True):
+            batch.append(tuple(row[:4]))
+            if len(batch) >= batch_size:
+                self.put_many(batch)
+                batch = []
+        self.put_many(batch)
+        wb.close()
+
+    def close(self):
+        self.connection.close()
+
+
+def _default_user_factory(user_id, name, phone, balance):
+    from payment_core import load_core
+
+    core = load_core()
+    return core.User(user_id, name, phone, core.Wallet(balance))
+
+
+class LazyUserRepository:
+    """Dict-like view of all users that keeps only the capacity most recently used in memory.
+
+    A miss faults the user in from the store. When the working set is full
+    the least recently used user is evicted, and written back first if it
+    is dirty: its balance changed since it was loaded, or it was assigned
+    with repo[user_id] = user. MobilePaymentSystem can use it in place of
+    its users dict. Hit rate and eviction counts are kept so the cache can
+    be sized.
+
+    Users inside a pinned() block are never evicted, so an operation that
+    holds several User objects keeps changing the cached copies. While
+    everything cached is pinned the cache grows past capacity instead.
+    """
+
+    def __init__(self, store, capacity=100000, user_factory=None):
+        if capacity < 3:
+            raise ValueError("capacity must hold at least a sender, a receiver and the fee account")
+        self.store = store
+        self.capacity = capacity
+        self.user_factory = user_factory or _default_user_factory
+        self._cache = OrderedDict()  # user_id -> (user, balance when loaded, or None if new)
+        self._pins = {}  # user_id -> number of open pinned() blocks holding it
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writebacks = 0
+
+    def _row(self, user):
+        return (user.user_id, user.name, user.phone_number, user.wallet.check_balance())
+
+    def _is_dirty(self, user, loaded_balance):
+        return loaded_balance is None or user.wallet.check_balance() != loaded_balance
+
+    @contextmanager
+    def pinned(self, user_ids):
+        """Keep user_ids from being evicted until the block ends."""
+        for user_id in user_ids:
+            self._pins[user_id] = self._pins.get(user_id, 0) + 1
+        try:
+            yield
+        finally:
+            for user_id in user_ids:
+                if self._pins[user_id] == 1:
+                    del self._pins[user_id]
+                else:
+                    self._pins[user_id] -= 1
+
+    def _insert(self, user_id, user, loaded_balance):
+        self._cache[user_id] = (user, loaded_balance)
+        if len(self._cache) > self.capacity:
+            victim = next((cached_id for cached_id in self._cache
+                           if cached_id not in self._pins and cached_id != user_id), None)
+            if victim is None:
+                return
+            evicted, evicted_balance = self._cache.pop(victim)
+            self.evictions += 1
+            if self._is_dirty(evicted, evicted_balance):
+                self.store.put_many([self._row(evicted)])
+                self.writebacks += 1
+
+    def get(self, user_id, default=None):
+        entry = self._cache.get(user_id)
+        if entry is not None:
+            self.hits += 1
+            self._cache.move_to_end(user_id)
+            return entry[0]
+        self.misses += 1
+        row = self.store.get(user_id)
+        if row is None:
+            return default
+        user = self.user_factory(*row)
+        self._insert(user_id, user, row[3])
+        return user
+
+    def __getitem__(self, user_id):
+        user = self.get(user_id)
+        if user is None:
+            raise KeyError(user_id)
+        return user
+
+    def __setitem__(self, user_id, user):
+        self._cache.pop(user_id, None)
+        self._insert(user_id, user, None)
+
+    def __contains__(self, user_id):
+        # A membership test does not fault the user in or count as a use.
+        return user_id in self._cache or self.store.get(user_id) is not None
+
+    def __len__(self):
+        self.flush()
+        return self.store.count()
+
+    def values(self):
+        """Every user: cached ones as they are, the rest streamed from the store."""
+        self.flush()
+        for row in self.store.rows():
+            entry = self._cache.get(row[0])
+            yield entry[0] if entry is not None else self.user_factory(*row)
+
+    def items(self):
+        for user in self.values():
+            yield user.user_id, user
+
+    def __iter__(self):
+        for user in self.values():
+            yield user.user_id
+
+    def flush(self):
+        """Write every dirty cached user back to the store and mark it clean."""
+        dirty = [(user_id, user) for user_id, (user, loaded) in self._cache.items() if self._is_dirty(user, loaded)]
+        if dirty:
+            self.store.put_many([self._row(user) for _, user in dirty])
+            self.writebacks += len(dirty)
+            for user_id, user in dirty:
+                self._cache[user_id] = (user, user.wallet.check_balance())
+
+    def metrics(self):
+        lookups = self.hits + self.misses
+        return {"cached": len(self._cache), "capacity": self.capacity, "hits": self.hits,
+                "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions, "writebacks": self.writebacks}